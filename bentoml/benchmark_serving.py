@@ -0,0 +1,218 @@
+"""BentoML 서빙 경로(GPU 외 오버헤드)의 지연시간 벤치마크입니다.
+
+서버는 stub pipeline으로 띄웁니다.
+    cd eng_serve && EMOJI_STUB_PIPELINE=true bentoml serve service.py:svc_eng
+
+closed-loop(동시 사용자 N명)과 open-loop(초당 도착률 고정, 포아송 도착) 부하를 만들고
+p50/p95/p99, 처리량을 출력합니다. 서버의 stage_timing.response_header를 켜면
+X-Stage-Timings 헤더의 단계별 평균 시간도 함께 출력합니다. --stages를 주면 같은 코드 경로의 단계별 시간
+(UserInput 검증, pipeline, resize, to_base64, rembg)을 프로세스 안에서 측정합니다.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import requests
+
+STAGE_HEADER = "X-Stage-Timings"
+
+
+def percentile(values: List[float], q: float) -> float:
+    """**정렬된 values의 q(0~100) 분위수를 선형 보간으로 구합니다.**"""
+    if not values:
+        return float("nan")
+    pos = (len(values) - 1) * q / 100
+    lower = int(pos)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (pos - lower)
+
+
+def summarize(name: str, latencies: List[float], elapsed: float, errors: int) -> Dict:
+    """**지연시간 목록을 p50/p95/p99, 처리량으로 요약합니다.**"""
+    latencies = sorted(latencies)
+    return {
+        "name": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+class LoadGenerator:
+    """**서비스에 요청을 보내고 요청별 지연시간을 모읍니다.**
+    Args:
+        url (str): 요청을 보낼 엔드포인트. ex) http://localhost:3000/eng_submit
+        payload (dict): UserInput 형태의 요청 body.
+        timeout (float): 요청 하나의 타임아웃(초).
+    """
+
+    def __init__(self, url: str, payload: dict, timeout: float = 900):
+        self.url = url
+        self.payload = payload
+        self.timeout = timeout
+        self.latencies: List[float] = []
+        self.errors = 0
+        # 서버가 X-Stage-Timings 헤더를 돌려주면 단계별 시간(ms)을 모읍니다.
+        self.stage_timings: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # 스레드마다 keep-alive 세션을 하나씩 사용합니다.
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def send(self, started_at: float) -> None:
+        """**요청을 하나 보내고 started_at부터 응답까지의 시간을 기록합니다.**"""
+        try:
+            response = self._session().post(
+                self.url, json=self.payload, timeout=self.timeout
+            )
+            ok = response.status_code == 200
+            timings = json.loads(response.headers.get(STAGE_HEADER, "{}"))
+        except requests.RequestException:
+            ok, timings = False, {}
+        latency = time.perf_counter() - started_at
+        with self._lock:
+            if ok:
+                self.latencies.append(latency)
+                for stage, ms in timings.items():
+                    self.stage_timings.setdefault(stage, []).append(ms)
+            else:
+                self.errors += 1
+
+    def report(self, name: str, elapsed: float) -> Dict:
+        """**지금까지 모은 결과를 요약합니다.**"""
+        result = summarize(name, self.latencies, elapsed, self.errors)
+        if self.stage_timings:
+            result["server_stages_ms"] = {
+                stage: sum(values) / len(values)
+                for stage, values in self.stage_timings.items()
+            }
+        return result
+
+    def closed_loop(self, concurrency: int, num_requests: int) -> Dict:
+        """**concurrency명의 사용자가 응답을 받자마자 다음 요청을 보냅니다.**"""
+        remaining = iter(range(num_requests))
+        remaining_lock = threading.Lock()
+
+        def user() -> None:
+            while True:
+                with remaining_lock:
+                    if next(remaining, None) is None:
+                        return
+                self.send(time.perf_counter())
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=user) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.report(f"closed(c={concurrency})", time.perf_counter() - start)
+
+    def open_loop(self, rate: float, duration: float, max_workers: int) -> Dict:
+        """**초당 rate개의 포아송 도착으로 duration초 동안 요청을 보냅니다.**
+        지연시간은 예정된 도착 시각부터 재므로 서버가 밀리면 대기시간도 포함됩니다.
+        """
+        start = time.perf_counter()
+        arrival = start
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while arrival - start < duration:
+                arrival += random.expovariate(rate)
+                delay = arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.send, arrival)
+        return self.report(f"open(rate={rate}/s)", time.perf_counter() - start)
+
+
+def measure_stages(service_dir: str, payload: dict, repeat: int) -> Dict[str, float]:
+    """**service.py의 함수들을 직접 호출해 단계별 평균 시간(ms)을 측정합니다.**
+    stub pipeline을 사용하므로 GPU 없이 실행할 수 있습니다.
+    """
+    os.environ["EMOJI_STUB_PIPELINE"] = "true"
+    sys.path.insert(0, os.path.abspath(service_dir))
+    import service
+    from background import remove_background
+
+    runnable = service.StableDiffusionRunnable()
+    timings: Dict[str, List[float]] = {}
+
+    def timed(stage: str, fn: Callable, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    for _ in range(repeat):
+        input_data = timed("validate", service.UserInput.parse_obj, payload)
+        images = timed(
+            "pipeline",
+            runnable.worker.pipe,
+            prompt=input_data.prompt,
+            num_images_per_prompt=input_data.num_images_per_prompt,
+        ).images
+        size = input_data.size
+        resized = [timed("resize", image.resize, (size, size)) for image in images]
+        for image in resized:
+            timed("to_base64", service.to_base64, image)
+            removed = timed("rembg", remove_background, image)
+            timed("to_base64_removed", service.to_base64, removed)
+    return {
+        stage: sum(values) / len(values) * 1000 for stage, values in timings.items()
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="BentoML 서빙 경로 벤치마크")
+    parser.add_argument("--url", default="http://localhost:3000/eng_submit")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=2.0, help="open-loop 초당 요청 수")
+    parser.add_argument("--duration", type=float, default=30.0, help="open-loop 시간(초)")
+    parser.add_argument("--max_workers", type=int, default=64)
+    parser.add_argument("--prompt", default="a cute bunny rabbit")
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--num_images_per_prompt", type=int, default=1)
+    parser.add_argument(
+        "--stages",
+        default=None,
+        metavar="SERVICE_DIR",
+        help="HTTP 대신 SERVICE_DIR의 service.py를 직접 불러 단계별 시간을 측정합니다.",
+    )
+    parser.add_argument("--repeat", type=int, default=10)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    payload = {
+        "prompt": args.prompt,
+        "size": args.size,
+        "num_images_per_prompt": args.num_images_per_prompt,
+    }
+    if args.stages:
+        result = measure_stages(args.stages, payload, args.repeat)
+    else:
+        generator = LoadGenerator(args.url, payload)
+        if args.mode == "closed":
+            result = generator.closed_loop(args.concurrency, args.requests)
+        else:
+            result = generator.open_loop(args.rate, args.duration, args.max_workers)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
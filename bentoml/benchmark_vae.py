@@ -0,0 +1,96 @@
+"""VAE decode의 batch 크기별 최대 GPU 메모리 사용량과 시간을 측정합니다.
+
+한 번에 decode하는 기존 방식과 vae_decode.tiled_decode(나눠서 decode)를 비교해,
+serving.yaml의 vae_decode 설정과 policy.max_images_per_prompt를 얼마나 올릴 수 있는지 확인합니다.
+    python benchmark_vae.py --batch_sizes 1 2 4 8 16 --tile_size 32 --overlap 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import torch
+from diffusers import AutoencoderKL
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "eng_serve")
+)
+from vae_decode import (  # noqa: E402
+    DEFAULT_SCALING_FACTOR,
+    tiled_decode,
+    to_numpy_images,
+)
+
+
+def measure(fn) -> dict:
+    """**fn을 실행하는 동안의 최대 GPU 메모리(MiB)와 시간(ms)을 잽니다.**"""
+    torch.cuda.empty_cache()
+    torch.cuda.reset_peak_memory_stats()
+    torch.cuda.synchronize()
+    start = time.perf_counter()
+    try:
+        fn()
+        torch.cuda.synchronize()
+    except torch.cuda.OutOfMemoryError:
+        return {"peak_mib": None, "time_ms": None, "oom": True}
+    return {
+        "peak_mib": torch.cuda.max_memory_allocated() / 2**20,
+        "time_ms": (time.perf_counter() - start) * 1000,
+        "oom": False,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="VAE decode 메모리 벤치마크")
+    parser.add_argument(
+        "--pretrained_model_name_or_path",
+        default="stabilityai/stable-diffusion-2-1-base",
+    )
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--resolution", type=int, default=512)
+    parser.add_argument("--decode_batch_size", type=int, default=1)
+    parser.add_argument("--tile_size", type=int, default=64)
+    parser.add_argument("--overlap", type=int, default=8)
+    return parser.parse_args()
+
+
+@torch.no_grad()
+def main() -> None:
+    args = parse_args()
+    vae = AutoencoderKL.from_pretrained(
+        args.pretrained_model_name_or_path, subfolder="vae", torch_dtype=torch.float16
+    ).to("cuda")
+    scaling_factor = getattr(vae.config, "scaling_factor", DEFAULT_SCALING_FACTOR)
+    latent_size = args.resolution // 8
+    results = []
+    for batch_size in args.batch_sizes:
+        latents = torch.randn(
+            batch_size, 4, latent_size, latent_size, device="cuda", dtype=torch.float16
+        )
+        # 두 방식 모두 pipeline의 decode_latents와 같은 일(decode + 후처리)을 측정합니다.
+        results.append(
+            {
+                "batch_size": batch_size,
+                "full": measure(
+                    lambda: to_numpy_images(vae.decode(latents / scaling_factor).sample)
+                ),
+                "tiled": measure(
+                    lambda: to_numpy_images(
+                        tiled_decode(
+                            vae,
+                            latents,
+                            args.decode_batch_size,
+                            args.tile_size,
+                            args.overlap,
+                        )
+                    )
+                ),
+            }
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import time
+from typing import Any, Dict, List
+
+import torch
+
+BACKENDS = ("xformers", "sdpa", "sliced", "default")
+
+
+def _has_lora(pipe) -> bool:
+    return any("LoRA" in type(p).__name__ for p in pipe.unet.attn_processors.values())
+
+
+def _enable_sdpa(pipe) -> None:
+    if not hasattr(torch.nn.functional, "scaled_dot_product_attention"):
+        raise RuntimeError(
+            "torch.nn.functional.scaled_dot_product_attention is not available"
+        )
+    try:
+        from diffusers.models.attention_processor import AttnProcessor2_0
+    except ImportError:
+        from diffusers.models.cross_attention import AttnProcessor2_0
+    pipe.unet.set_attn_processor(AttnProcessor2_0())
+
+
+def _enable(pipe, backend: str) -> None:
+    if backend == "xformers":
+        pipe.enable_xformers_memory_efficient_attention()
+    elif backend == "sdpa":
+        _enable_sdpa(pipe)
+    elif backend == "sliced":
+        pipe.enable_attention_slicing()
+    elif backend != "default":
+        raise ValueError(
+            f"unknown attention backend {backend!r}, choose from {BACKENDS}"
+        )
+
+
+def apply_attention_backend(pipe, backend: str, fallback: List[str]) -> str:
+    """**pipeline의 attention을 backend로 바꾸고, 실패하면 fallback 순서대로 시도합니다.**
+    backend를 적용하면서 LoRA attention processor가 사라지는 경우(LoRA를 지원하지 않는
+    processor로 바뀌는 경우)도 실패로 보고 원래 processor로 되돌립니다.
+    Args:
+        pipe (StableDiffusionPipeline): attention을 바꿀 pipeline.
+        backend (str): 적용할 backend. (xformers, sdpa, sliced, default)
+        fallback (List[str]): backend를 적용하지 못했을 때 차례로 시도할 backend 목록.
+    Returns:
+        str: 실제로 적용된 backend.
+    """
+    had_lora = _has_lora(pipe)
+    original = dict(pipe.unet.attn_processors)
+    for candidate in [backend] + [b for b in fallback if b != backend]:
+        try:
+            _enable(pipe, candidate)
+            if had_lora and not _has_lora(pipe):
+                raise RuntimeError("LoRA attention processors were replaced")
+            return candidate
+        except Exception as e:
+            print(f"attention backend {candidate}을 적용할 수 없습니다: {e}")
+            pipe.unet.set_attn_processor(original)
+    return "default"
+
+
+def _time_generation(pipe, batch_size: int, steps: int, repeat: int) -> float:
+    device = pipe.device
+    with torch.autocast(device.type):
+        # 첫 호출은 kernel 준비 시간이 섞이므로 측정에서 뺍니다.
+        pipe(
+            prompt="warmup", num_inference_steps=steps, num_images_per_prompt=batch_size
+        )
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            pipe(
+                prompt="warmup",
+                num_inference_steps=steps,
+                num_images_per_prompt=batch_size,
+            )
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+    return (time.perf_counter() - start) / repeat
+
+
+def select_attention_backend(pipe, config: Dict[str, Any]) -> str:
+    """**serving.yaml의 attention 설정에 따라 backend를 골라 pipeline에 적용합니다.**
+    backend가 auto라면 fallback 목록의 backend를 하나씩 적용해 benchmark_batch_size장을
+    짧게 생성해 보고 가장 빠른 backend를 고릅니다.
+    Args:
+        pipe (StableDiffusionPipeline): attention을 바꿀 pipeline.
+        config (dict): serving.yaml의 attention 설정.
+    Returns:
+        str: 적용된 backend.
+    """
+    fallback = config["fallback"]
+    if config["backend"] != "auto":
+        return apply_attention_backend(pipe, config["backend"], fallback)
+
+    original = dict(pipe.unet.attn_processors)
+    timings = {}
+    for candidate in fallback:
+        pipe.unet.set_attn_processor(original)
+        applied = apply_attention_backend(pipe, candidate, [])
+        if applied != candidate and candidate != "default":
+            continue
+        timings[candidate] = _time_generation(
+            pipe,
+            config["benchmark_batch_size"],
+            config["benchmark_steps"],
+            config["benchmark_repeat"],
+        )
+    print(f"attention backend별 생성 시간(초): {timings}")
+    pipe.unet.set_attn_processor(original)
+    fastest = min(timings, key=timings.get) if timings else "default"
+    return apply_attention_backend(pipe, fastest, fallback)
@@ -0,0 +1,28 @@
+from typing import Any, Mapping
+
+# 식별할 수 있는 정보가 없는 요청이 함께 쓰는 식별자입니다.
+ANONYMOUS = "anonymous"
+
+
+def client_id_from_headers(
+    headers: Mapping[str, str], fallback: str = ANONYMOUS
+) -> str:
+    """**X-Client-Id, X-Forwarded-For의 첫 주소 순으로 클라이언트 식별자를 찾습니다.**
+    BentoML API의 ctx.request는 headers만 가지고 있으므로, 헤더가 없다면 fallback을 리턴합니다.
+    """
+    forwarded = headers.get("X-Forwarded-For")
+    return (
+        headers.get("X-Client-Id")
+        or (forwarded.split(",")[0].strip() if forwarded else None)
+        or fallback
+    )
+
+
+def client_id_from_request(request: Any) -> str:
+    """**FastAPI(Starlette) Request의 헤더, 없으면 연결한 주소로 클라이언트 식별자를 찾습니다.**
+    헤더가 없는 요청들이 한 식별자로 묶여 max_per_client를 함께 쓰지 않도록 연결한 주소를 사용합니다.
+    """
+    client = getattr(request, "client", None)
+    return client_id_from_headers(
+        request.headers, client.host if client and client.host else ANONYMOUS
+    )
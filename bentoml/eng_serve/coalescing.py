@@ -0,0 +1,169 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import bentoml
+from pydantic import BaseModel
+
+# runner 호출 없이 다른 요청의 결과를 나눠 받은 요청 수입니다.
+coalesced_counter = bentoml.metrics.Counter(
+    name="coalesced_requests_total",
+    documentation="Requests served by another in-flight runner call",
+    labelnames=["mode"],
+)
+
+
+def _slice_result(result: Dict[str, Any], start: int, stop: int) -> Dict[str, Any]:
+    """**result의 list 값(images, removes)을 [start:stop]으로 잘라 새 dict를 만듭니다.**"""
+    return {
+        key: value[start:stop] if isinstance(value, list) else value
+        for key, value in result.items()
+    }
+
+
+class SingleFlight:
+    """**같은 key의 호출이 진행 중이면 새로 호출하지 않고 그 결과를 함께 기다립니다.**"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """**key로 fn을 한 번만 실행합니다.**
+        Returns:
+            Tuple[Any, bool]: fn의 결과와, 다른 호출의 결과를 공유받았는지 여부.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result(), False
+
+
+class _FoldGroup:
+    def __init__(self):
+        self.total = 0
+        self.future: Future = Future()
+
+
+class BatchFolder:
+    """**짧은 시간 안에 들어온 같은 key의 요청들을 이미지 개수를 합친 호출 하나로 묶습니다.**
+    Args:
+        window (float): 첫 요청이 다른 요청을 기다리는 시간(초).
+        max_images (int): 한 호출로 묶을 수 있는 최대 이미지 개수.
+    """
+
+    def __init__(self, window: float, max_images: int):
+        self.window = window
+        self.max_images = max_images
+        self._lock = threading.Lock()
+        self._open: Dict[Hashable, _FoldGroup] = {}
+
+    def run(
+        self,
+        key: Hashable,
+        num_images: int,
+        fn: Callable[[int], Dict[str, Any]],
+        max_images: Optional[int] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """**num_images장을 요청하고, 묶인 호출 결과 중 자기 몫만 잘라 리턴합니다.**
+        Args:
+            fn (Callable[[int], dict]): 묶인 전체 이미지 개수를 받아 runner를 호출하는 함수.
+            max_images (Optional[int]): 이 요청을 묶을 수 있는 최대 이미지 개수.
+                self.max_images보다 작다면 이 값을 사용합니다.
+        Returns:
+            Tuple[dict, bool]: 잘라낸 결과와, 다른 요청이 보낸 호출에 묶였는지 여부.
+        """
+        limit = (
+            self.max_images if max_images is None else min(max_images, self.max_images)
+        )
+        with self._lock:
+            group = self._open.get(key)
+            leader = group is None or group.total + num_images > limit
+            if leader:
+                group = self._open[key] = _FoldGroup()
+            offset = group.total
+            group.total += num_images
+        if leader:
+            time.sleep(self.window)
+            with self._lock:
+                # 더 이상 이 그룹에 요청이 붙지 않도록 닫습니다.
+                if self._open.get(key) is group:
+                    del self._open[key]
+            try:
+                group.future.set_result(fn(group.total))
+            except BaseException as e:
+                group.future.set_exception(e)
+        return _slice_result(group.future.result(), offset, offset + num_images), not leader
+
+
+class RequestCoalescer:
+    """**진행 중인 중복 요청을 runner 호출 하나로 합칩니다.**
+    seed가 있는 요청은 결과가 같으므로 모든 파라미터가 같으면 호출 하나를 공유합니다.
+    seed가 없는 요청은 fold_unseeded가 켜져 있을 때, num_images_per_prompt를 제외한
+    파라미터가 같으면 이미지 개수를 합친 호출 하나로 묶은 뒤 나눠 줍니다.
+    묶인 호출도 요청 하나와 같은 policy 한도(이미지 개수, 비용)를 넘지 않도록 max_images_for로 자릅니다.
+    Args:
+        config (dict): serving.yaml의 coalescing 설정.
+        max_images_for (Optional[Callable[[int], int]]): step 수를 받아 한 호출의 최대 이미지 개수를
+            리턴하는 함수. (RequestPolicy.max_images_for)
+    """
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        max_images_for: Optional[Callable[[int], int]] = None,
+    ):
+        self.enabled = config["enabled"]
+        self.fold_unseeded = config["fold_unseeded"]
+        self.single_flight = SingleFlight()
+        self.folder = BatchFolder(config["fold_window"], config["max_folded_images"])
+        self.max_images_for = max_images_for
+
+    def run(
+        self, input_data: BaseModel, call: Callable[[BaseModel], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """**input_data를 처리한 결과를 리턴합니다. 리턴된 dict는 요청마다 새로 만들어집니다.**
+        Args:
+            input_data (BaseModel): 유저의 인풋입니다.
+            call (Callable[[BaseModel], dict]): runner를 호출하는 함수.
+            다른 요청과 합쳐지면 먼저 들어온 요청의 call만 실행됩니다.
+        """
+        if not self.enabled:
+            return call(input_data)
+        params = input_data.dict()
+        if params.get("seed") is not None:
+            key = tuple(sorted(params.items()))
+            result, shared = self.single_flight.do(key, lambda: call(input_data))
+            if shared:
+                coalesced_counter.labels(mode="shared").inc()
+            return dict(result)
+        if self.fold_unseeded:
+            num_images = params.pop("num_images_per_prompt")
+            key = tuple(sorted(params.items()))
+            max_images = None
+            if self.max_images_for is not None:
+                max_images = self.max_images_for(params["num_inference_steps"])
+            result, folded = self.folder.run(
+                key,
+                num_images,
+                lambda total: call(
+                    input_data.copy(update={"num_images_per_prompt": total})
+                ),
+                max_images,
+            )
+            if folded:
+                coalesced_counter.labels(mode="folded").inc()
+            return result
+        return call(input_data)
@@ -0,0 +1,119 @@
+from typing import Any, Dict, List, Optional
+
+import torch
+
+# CLIP text encoder가 만드는 토큰 길이입니다.
+TEXT_LENGTH = 77
+
+
+def _pad_batch(tensor: torch.Tensor, size: int) -> torch.Tensor:
+    """**마지막 항목을 반복해 tensor의 batch를 size로 늘립니다.**"""
+    pad = size - tensor.shape[0]
+    if pad <= 0:
+        return tensor
+    return torch.cat([tensor, tensor[-1:].expand(pad, *tensor.shape[1:])])
+
+
+class BucketedUNetForward:
+    """**미리 컴파일한 몇 개의 batch 크기(bucket)로 입력을 맞춰 UNet을 실행합니다.**
+    들어온 batch를 가장 가까운 bucket까지 패딩해 컴파일된 UNet을 실행하고 결과를 잘라 돌려줍니다.
+    bucket보다 큰 batch나 latent/text 크기가 다른 입력은 재컴파일하지 않고 eager로 실행합니다.
+    Args:
+        unet (UNet2DConditionModel): 감쌀 UNet.
+        buckets (List[int]): 컴파일할 UNet batch 크기 목록.
+        mode (str): torch.compile의 mode. reduce-overhead는 CUDA graph를 사용합니다.
+    """
+
+    def __init__(self, unet, buckets: List[int], mode: str):
+        self.unet = unet
+        self.eager = unet.forward
+        self.compiled = torch.compile(unet.forward, mode=mode, dynamic=False)
+        self.buckets = sorted(buckets)
+        self.latent_shape = (
+            unet.config.in_channels,
+            unet.config.sample_size,
+            unet.config.sample_size,
+        )
+
+    def _bucket(self, sample: torch.Tensor, encoder_hidden_states) -> Optional[int]:
+        if tuple(sample.shape[1:]) != self.latent_shape:
+            return None
+        if (
+            encoder_hidden_states is None
+            or encoder_hidden_states.shape[1] != TEXT_LENGTH
+        ):
+            return None
+        for bucket in self.buckets:
+            if sample.shape[0] <= bucket:
+                return bucket
+        return None
+
+    def __call__(self, sample, timestep, encoder_hidden_states=None, *args, **kwargs):
+        bucket = self._bucket(sample, encoder_hidden_states)
+        if bucket is None:
+            return self.eager(sample, timestep, encoder_hidden_states, *args, **kwargs)
+        batch = sample.shape[0]
+        if (
+            torch.is_tensor(timestep)
+            and timestep.dim() > 0
+            and timestep.shape[0] == batch
+        ):
+            timestep = _pad_batch(timestep, bucket)
+        output = self.compiled(
+            _pad_batch(sample, bucket),
+            timestep,
+            _pad_batch(encoder_hidden_states, bucket),
+            *args,
+            **kwargs,
+        )
+        # CUDA graph는 출력 버퍼를 다음 실행에서 다시 쓰므로 잘라낸 결과를 복사해 둡니다.
+        if isinstance(output, tuple):
+            return (output[0][:batch].clone(),) + tuple(output[1:])
+        return type(output)(sample=output.sample[:batch].clone())
+
+    @torch.no_grad()
+    def warmup(self) -> None:
+        """**모든 bucket을 한 번씩 실행해 미리 컴파일해 둡니다.**"""
+        for bucket in self.buckets:
+            sample = torch.zeros(
+                bucket,
+                *self.latent_shape,
+                device=self.unet.device,
+                dtype=self.unet.dtype,
+            )
+            encoder_hidden_states = torch.zeros(
+                bucket,
+                TEXT_LENGTH,
+                self.unet.config.cross_attention_dim,
+                device=self.unet.device,
+                dtype=self.unet.dtype,
+            )
+            timestep = torch.tensor(999, device=self.unet.device)
+            with torch.autocast(self.unet.device.type):
+                self(sample, timestep, encoder_hidden_states)
+
+
+def compile_unet(pipe, config: Dict[str, Any]) -> bool:
+    """**serving.yaml의 compile 설정에 따라 pipeline의 UNet을 bucket별로 컴파일합니다.**
+    classifier-free guidance를 사용하면 UNet batch는 이미지 개수의 2배이므로
+    image_buckets의 각 값을 2배 한 크기로 컴파일합니다.
+    Args:
+        pipe (StableDiffusionPipeline): UNet을 컴파일할 pipeline.
+        config (dict): serving.yaml의 compile 설정.
+    Returns:
+        bool: 컴파일된 UNet을 사용하게 되었는지 여부. torch.compile이 없다면(torch<2.0) False.
+    """
+    if not config["enabled"]:
+        return False
+    if not hasattr(torch, "compile"):
+        print(
+            "torch.compile을 사용할 수 없어 eager UNet을 사용합니다. (torch>=2.0 필요)"
+        )
+        return False
+    forward = BucketedUNetForward(
+        pipe.unet, [2 * images for images in config["image_buckets"]], config["mode"]
+    )
+    pipe.unet.forward = forward
+    if config["warmup"]:
+        forward.warmup()
+    return True
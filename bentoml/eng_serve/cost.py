@@ -0,0 +1,43 @@
+from typing import Dict
+
+# 비용 1은 512px 이미지 한 장을 30 step으로 생성하는 작업입니다.
+REFERENCE_STEPS = 30
+REFERENCE_RESOLUTION = 512
+# 모델이 실제로 생성하는 해상도입니다. size는 생성 후 resize에만 사용됩니다.
+GENERATION_RESOLUTION = 512
+
+# cost_class의 상한값입니다. 위에서부터 처음으로 비용이 상한 이하인 class가 선택됩니다.
+COST_CLASSES: Dict[str, float] = {
+    "small": 1.0,
+    "medium": 2.0,
+    "large": float("inf"),
+}
+
+
+def estimate_cost(
+    num_inference_steps: int,
+    num_images_per_prompt: int,
+    resolution: int = GENERATION_RESOLUTION,
+) -> float:
+    """**요청한 작업량(steps × images × 해상도)으로 GPU 비용을 추정합니다.**
+    Args:
+        num_inference_steps (int): 추론 스텝 수.
+        num_images_per_prompt (int): 생성할 이미지 개수.
+        resolution (int): 생성 해상도. UNet 연산량은 픽셀 수에 비례합니다.
+    Returns:
+        float: 512px 이미지 한 장을 30 step으로 생성하는 작업을 1로 둔 상대 비용.
+    """
+    return (
+        num_images_per_prompt
+        * num_inference_steps
+        / REFERENCE_STEPS
+        * (resolution / REFERENCE_RESOLUTION) ** 2
+    )
+
+
+def cost_class(cost: float) -> str:
+    """**비용을 small/medium/large 구간으로 나눕니다. (metric label용)**"""
+    for name, upper in COST_CLASSES.items():
+        if cost <= upper:
+            return name
+    return "large"
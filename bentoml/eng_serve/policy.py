@@ -0,0 +1,158 @@
+import math
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+
+from cost import estimate_cost
+
+
+class PolicyViolation(Exception):
+    """**요청이 배포 정책을 벗어나 거절해야 할 때 발생합니다.**"""
+
+
+class RequestPolicy:
+    """**배포마다 정하는 요청 파라미터 한도와 요청당 비용 한도입니다.**
+    mode가 clamp라면 한도를 넘는 값을 한도 안으로 줄이고, reject라면 PolicyViolation을 던집니다.
+    허용되지 않은 model은 줄일 수 없으므로 항상 거절합니다.
+    Args:
+        config (dict): serving.yaml의 policy 설정.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.mode = config["mode"]
+        self.allowed_models: List[str] = config["allowed_models"]
+        self.max_prompt_length = config["max_prompt_length"]
+        self.min_size = config["min_size"]
+        self.max_size = config["max_size"]
+        self.max_inference_steps = config["max_inference_steps"]
+        self.max_images_per_prompt = config["max_images_per_prompt"]
+        self.max_guidance_scale = config["max_guidance_scale"]
+        self.max_cost = config["max_cost"]
+
+    def max_images_for(self, num_inference_steps: int) -> int:
+        """**num_inference_steps로 한 번에 생성할 수 있는 최대 이미지 개수입니다.**
+        max_images_per_prompt와 비용 한도(max_cost)를 모두 만족하는 개수로, 최소 1장입니다.
+        """
+        per_image = estimate_cost(num_inference_steps, 1)
+        return max(
+            1, min(self.max_images_per_prompt, math.floor(self.max_cost / per_image))
+        )
+
+    def _limit(
+        self, name: str, value: Any, lower: Any, upper: Any, errors: List[str]
+    ) -> Any:
+        """**value를 [lower, upper]로 자르고, 벗어났다면 errors에 기록합니다.**"""
+        limited = min(max(value, lower), upper)
+        if limited != value:
+            errors.append(f"{name}={value} is out of range [{lower}, {upper}]")
+        return limited
+
+    def apply(self, input_data: BaseModel) -> BaseModel:
+        """**input_data를 정책에 맞게 검사하고, 필요하면 값을 줄인 사본을 리턴합니다.**
+        Args:
+            input_data (BaseModel): 유저의 인풋입니다. (UserInput)
+        Returns:
+            BaseModel: 정책을 만족하는 인풋. 바뀐 값이 없다면 input_data 그대로입니다.
+        Raises:
+            PolicyViolation: reject 모드에서 한도를 넘었거나, 허용되지 않은 model인 경우.
+        """
+        if self.allowed_models and input_data.model not in self.allowed_models:
+            raise PolicyViolation(
+                f"model={input_data.model!r} is not one of {self.allowed_models}"
+            )
+        errors: List[str] = []
+        if len(input_data.prompt) > self.max_prompt_length:
+            errors.append(f"prompt is longer than {self.max_prompt_length} characters")
+        negative_prompt = input_data.negative_prompt
+        if negative_prompt and len(negative_prompt) > self.max_prompt_length:
+            errors.append(
+                f"negative_prompt is longer than {self.max_prompt_length} characters"
+            )
+            negative_prompt = negative_prompt[: self.max_prompt_length]
+        limits = {
+            "size": (self.min_size, self.max_size),
+            "num_inference_steps": (1, self.max_inference_steps),
+            "num_images_per_prompt": (1, self.max_images_per_prompt),
+            "guidance_scale": (0, self.max_guidance_scale),
+        }
+        fields = type(input_data).__fields__
+        updates = {
+            "prompt": input_data.prompt[: self.max_prompt_length],
+            "negative_prompt": negative_prompt,
+        }
+        for name, (lower, upper) in limits.items():
+            value = getattr(input_data, name)
+            # None이 들어오면 UserInput의 기본값을 사용합니다.
+            value = fields[name].default if value is None else value
+            updates[name] = self._limit(name, value, lower, upper, errors)
+
+        cost = estimate_cost(
+            updates["num_inference_steps"], updates["num_images_per_prompt"]
+        )
+        if cost > self.max_cost:
+            errors.append(
+                f"estimated cost {cost:.2f} exceeds the budget {self.max_cost}"
+            )
+            # 이미지 개수를 먼저 줄이고, 한 장으로도 넘는다면 step을 줄입니다.
+            per_image = cost / updates["num_images_per_prompt"]
+            updates["num_images_per_prompt"] = max(
+                1, math.floor(self.max_cost / per_image)
+            )
+            if per_image > self.max_cost:
+                updates["num_inference_steps"] = max(
+                    1,
+                    math.floor(
+                        updates["num_inference_steps"] * self.max_cost / per_image
+                    ),
+                )
+        if errors and self.mode == "reject":
+            raise PolicyViolation("; ".join(errors))
+        if all(getattr(input_data, name) == value for name, value in updates.items()):
+            return input_data
+        return input_data.copy(update=updates)
+
+    def apply_variation(self, input_data: BaseModel) -> BaseModel:
+        """**variation 요청(VariationInput)의 size, step, 이미지 개수, strength를 정책에 맞게 자릅니다.**
+        strength만큼의 step만 실행하므로 비용 한도는 step × strength로 계산합니다.
+        Raises:
+            PolicyViolation: reject 모드에서 한도를 넘은 경우.
+        """
+        errors: List[str] = []
+        limits = {
+            "size": (self.min_size, self.max_size),
+            "num_inference_steps": (1, self.max_inference_steps),
+            "num_images_per_prompt": (1, self.max_images_per_prompt),
+            "strength": (0.01, 1.0),
+        }
+        fields = type(input_data).__fields__
+        updates = {}
+        for name, (lower, upper) in limits.items():
+            value = getattr(input_data, name)
+            value = fields[name].default if value is None else value
+            updates[name] = self._limit(name, value, lower, upper, errors)
+
+        cost = estimate_cost(
+            updates["num_inference_steps"] * updates["strength"],
+            updates["num_images_per_prompt"],
+        )
+        if cost > self.max_cost:
+            errors.append(
+                f"estimated cost {cost:.2f} exceeds the budget {self.max_cost}"
+            )
+            per_image = cost / updates["num_images_per_prompt"]
+            updates["num_images_per_prompt"] = max(
+                1, math.floor(self.max_cost / per_image)
+            )
+            if per_image > self.max_cost:
+                # apply와 같이 한 장으로도 넘는다면 step을 줄입니다. (실행되는 step은 step × strength)
+                updates["num_inference_steps"] = max(
+                    1,
+                    math.floor(
+                        updates["num_inference_steps"] * self.max_cost / per_image
+                    ),
+                )
+        if errors and self.mode == "reject":
+            raise PolicyViolation("; ".join(errors))
+        if all(getattr(input_data, name) == value for name, value in updates.items()):
+            return input_data
+        return input_data.copy(update=updates)
@@ -0,0 +1,64 @@
+import threading
+from collections import OrderedDict
+from typing import List, Union
+
+import bentoml
+import torch
+
+cache_counter = bentoml.metrics.Counter(
+    name="negative_prompt_cache_total",
+    documentation="Negative prompt embedding cache lookups",
+    labelnames=["result"],
+)
+
+
+@torch.no_grad()
+def encode_text(pipe, text: Union[str, List[str]]) -> torch.Tensor:
+    """**pipeline의 _encode_prompt와 같은 방식으로 text를 (len(text), 77, dim) embedding으로 바꿉니다.**"""
+    tokenizer, text_encoder = pipe.tokenizer, pipe.text_encoder
+    inputs = tokenizer(
+        text,
+        padding="max_length",
+        max_length=tokenizer.model_max_length,
+        truncation=True,
+        return_tensors="pt",
+    )
+    attention_mask = None
+    if getattr(text_encoder.config, "use_attention_mask", False):
+        attention_mask = inputs.attention_mask.to(pipe.device)
+    return text_encoder(
+        inputs.input_ids.to(pipe.device), attention_mask=attention_mask
+    )[0]
+
+
+class EmbeddingCache:
+    """**negative prompt의 text encoder 출력을 LRU로 저장합니다.**
+    "low quality" 같은 몇 개의 negative prompt가 대부분이고, negative prompt가 없을 때도
+    빈 문자열의 unconditional embedding을 매번 다시 계산하므로 한 번 계산한 값을 재사용합니다.
+    pipeline(device)마다 하나씩 만들어 사용합니다.
+    Args:
+        pipe (StableDiffusionPipeline): tokenizer와 text_encoder를 사용할 pipeline.
+        max_entries (int): 저장할 최대 embedding 개수. 0이면 저장하지 않고 매번 계산합니다.
+    """
+
+    def __init__(self, pipe, max_entries: int):
+        self.pipe = pipe
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, torch.Tensor]" = OrderedDict()
+
+    def get(self, text: str) -> torch.Tensor:
+        """**text의 (1, 77, dim) embedding을 리턴합니다. 없으면 계산해서 저장합니다.**"""
+        with self._lock:
+            embedding = self._entries.get(text)
+            if embedding is not None:
+                self._entries.move_to_end(text)
+                cache_counter.labels(result="hit").inc()
+                return embedding
+        cache_counter.labels(result="miss").inc()
+        embedding = encode_text(self.pipe, text)
+        with self._lock:
+            self._entries[text] = embedding
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return embedding
@@ -0,0 +1,201 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+# device나 runtime의 문제를 나타내는 오류 메시지의 일부입니다. (소문자)
+DEVICE_ERROR_MARKERS = (
+    "cuda",
+    "out of memory",
+    "cudnn",
+    "cublas",
+    "device-side",
+    "nccl",
+)
+
+
+class NoHealthyWorker(Exception):
+    """**요청을 처리할 수 있는 runner가 하나도 없을 때 발생합니다.**"""
+
+
+def is_device_failure(error: BaseException) -> bool:
+    """**worker의 device나 runtime 문제로 생긴 오류인지 확인합니다.**
+    CUDA 오류, OOM 같은 오류만 worker의 health에 반영하고,
+    잘못된 입력으로 생긴 오류(ValueError, IndexError 등)는 반영하지 않습니다.
+    클라이언트가 일부러 잘못된 요청을 보내 worker를 unhealthy로 만들 수 없도록 하기 위함입니다.
+    """
+    if isinstance(error, MemoryError):
+        return True
+    # torch.cuda.OutOfMemoryError와 CUDA/cuDNN 오류는 모두 RuntimeError입니다.
+    if isinstance(error, RuntimeError) and not isinstance(error, NotImplementedError):
+        message = str(error).lower()
+        return any(marker in message for marker in DEVICE_ERROR_MARKERS)
+    return False
+
+
+class PipelineWorker:
+    """**runner 안에 올린 pipeline 하나와 그 pipeline이 올라간 device입니다.**
+    pipeline은 thread-safe하지 않으므로 한 번에 요청 하나만 실행합니다.
+    Args:
+        name (str): worker 이름. (로그용)
+        device (str): pipeline이 올라간 device. ex) cuda:0
+        pipe (Any): StableDiffusionPipeline 또는 StubPipeline.
+        active_adapter (Optional[str]): 현재 unet에 적용된 LoRA 이름.
+    """
+
+    def __init__(
+        self, name: str, device: str, pipe: Any, active_adapter: Optional[str] = None
+    ):
+        self.name = name
+        self.device = device
+        self.pipe = pipe
+        self.active_adapter = active_adapter
+        # pipeline에 적용된 attention backend입니다. (attention.py)
+        self.attention_backend = "default"
+        self.lock = threading.Lock()
+
+
+class RunnerWorker:
+    """**API 서버가 요청을 보낼 BentoML runner 하나와, API 서버에서 본 그 runner의 상태입니다.**
+    runner는 받은 요청을 자신의 큐에서 하나씩 실행하므로 API 서버에서는 잠그지 않고 바로 보냅니다.
+    Args:
+        name (str): worker 이름. (상태 조회용, runner 이름)
+        runner (Any): 요청을 보낼 bentoml.Runner.
+        active_adapter (Optional[str]): 마지막으로 보낸 요청의 LoRA 이름.
+            runner는 받은 순서대로 실행하므로 큐가 비면 이 LoRA가 적용되어 있습니다.
+    """
+
+    def __init__(self, name: str, runner: Any, active_adapter: Optional[str] = None):
+        self.name = name
+        self.runner = runner
+        self.active_adapter = active_adapter
+        # 이 runner에 보냈지만 아직 끝나지 않은 요청(실행 중 + runner 큐에서 대기 중)의 비용 합입니다.
+        self.outstanding = 0.0
+        self.healthy = True
+        self.unhealthy_since = 0.0
+        self.consecutive_failures = 0
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "active_adapter": self.active_adapter,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class RunnerPool:
+    """**여러 runner 중 남은 작업이 가장 적은 runner로 요청을 보냅니다.**
+    BentoML runner는 메서드 호출을 하나씩 실행하므로, 여러 GPU를 동시에 쓰려면 GPU마다 runner를 두고
+    API 서버에서 나눠 보내야 합니다.
+    요청한 LoRA가 마지막으로 보내진 runner가 있고, 그 runner의 남은 작업이 가장 적은 runner보다
+    affinity_slack 이하로만 많다면 adapter를 다시 불러오지 않도록 그 runner를 고릅니다.
+    device 오류(is_device_failure)나 failure_types의 오류로 연속 max_failures번 실패한 runner는
+    unhealthy로 표시되어 배정되지 않다가, recovery_seconds가 지나면 다시 요청을 받아 회복 여부를 확인합니다.
+    Args:
+        workers (List[RunnerWorker]): 요청을 처리할 runner 목록.
+        config (dict): serving.yaml의 runner_pool 설정.
+        failure_types (Tuple[Type[BaseException], ...]): runner의 실패로 셀 오류 타입.
+            ex) remote runner의 RemoteException, timeout
+    """
+
+    def __init__(
+        self,
+        workers: List[RunnerWorker],
+        config: Dict[str, Any],
+        failure_types: Tuple[Type[BaseException], ...] = (),
+    ):
+        self.workers = workers
+        self.affinity_slack = config["affinity_slack"]
+        self.max_failures = config["max_failures"]
+        self.recovery_seconds = config["recovery_seconds"]
+        self.failure_types = failure_types
+        self._lock = threading.Lock()
+
+    def _select(self, adapter: Optional[str]) -> RunnerWorker:
+        now = time.monotonic()
+        for worker in self.workers:
+            if (
+                not worker.healthy
+                and now - worker.unhealthy_since > self.recovery_seconds
+            ):
+                # 한 번 더 실패하면 바로 unhealthy로 돌아가도록 실패 횟수는 그대로 둡니다.
+                worker.healthy = True
+        healthy = [worker for worker in self.workers if worker.healthy]
+        if not healthy:
+            raise NoHealthyWorker("all runners are unhealthy")
+        least_loaded = min(healthy, key=lambda worker: worker.outstanding)
+        warm = [worker for worker in healthy if worker.active_adapter == adapter]
+        if warm and adapter is not None:
+            best_warm = min(warm, key=lambda worker: worker.outstanding)
+            if best_warm.outstanding <= least_loaded.outstanding + self.affinity_slack:
+                return best_warm
+        return least_loaded
+
+    @contextmanager
+    def acquire(
+        self,
+        adapter: Optional[str],
+        cost: float,
+        worker: Optional[RunnerWorker] = None,
+    ):
+        """**요청을 보낼 runner를 골라 with 블록에 넘겨줍니다.**
+        with 블록이 끝날 때까지 그 runner의 남은 작업으로 셉니다.
+        Args:
+            adapter (Optional[str]): 요청이 사용할 LoRA 이름. 모른다면 None.
+            cost (float): cost.estimate_cost로 추정한 요청의 비용.
+            worker (Optional[RunnerWorker]): 지정하면 고르지 않고 이 runner를 사용합니다.
+        Raises:
+            NoHealthyWorker: healthy한 runner가 없는 경우.
+        """
+        with self._lock:
+            worker = worker or self._select(adapter)
+            worker.outstanding += cost
+            if adapter is not None:
+                worker.active_adapter = adapter
+        try:
+            yield worker
+        except Exception as error:
+            if not (is_device_failure(error) or isinstance(error, self.failure_types)):
+                # 입력 때문에 생긴 오류는 worker 상태를 바꾸지 않고 그대로 올려 보냅니다.
+                raise
+            with self._lock:
+                worker.consecutive_failures += 1
+                if worker.consecutive_failures >= self.max_failures:
+                    worker.healthy = False
+                    worker.unhealthy_since = time.monotonic()
+            raise
+        else:
+            with self._lock:
+                worker.consecutive_failures = 0
+        finally:
+            with self._lock:
+                worker.outstanding -= cost
+
+    def tag_result_ids(
+        self, worker: RunnerWorker, result: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """**result의 result_ids 앞에 그 결과를 만든 runner의 번호를 붙입니다. ex) 1-<uuid>**
+        result_id의 latent는 그 runner 프로세스에만 저장되므로, variation을 같은 runner로 보내기 위함입니다.
+        """
+        if result.get("result_ids"):
+            index = self.workers.index(worker)
+            result["result_ids"] = [
+                f"{index}-{result_id}" for result_id in result["result_ids"]
+            ]
+        return result
+
+    def route_result_id(self, result_id: str) -> Tuple[Optional[RunnerWorker], str]:
+        """**tag_result_ids로 만든 result_id에서 결과를 가진 runner와 runner 안의 result_id를 찾습니다.**
+        runner 번호가 없거나 없는 runner의 번호라면 (None, result_id)를 리턴합니다.
+        """
+        index, _, local_id = result_id.partition("-")
+        if not local_id or not index.isdigit() or int(index) >= len(self.workers):
+            return None, result_id
+        return self.workers[int(index)], local_id
+
+    def status(self) -> List[Dict[str, Any]]:
+        """**runner별 상태 목록을 리턴합니다.**"""
+        with self._lock:
+            return [worker.status() for worker in self.workers]
@@ -0,0 +1,49 @@
+import time
+from types import SimpleNamespace
+from typing import List, Optional, Union
+
+from PIL import Image
+
+
+class StubUNet:
+    """**LoRA 로딩을 흉내내는 UNet stub입니다.**"""
+
+    def load_attn_procs(self, path: str) -> None:
+        pass
+
+
+class StubPipeline:
+    """**GPU 없이 서빙 경로를 측정하기 위한 CPU stub pipeline입니다.**
+    StableDiffusionPipeline과 같은 방식으로 호출하면 고정된 이미지를 리턴하므로,
+    JSON 검증, runner dispatch, base64 인코딩, rembg 등 GPU 외 오버헤드만 측정할 수 있습니다.
+    Args:
+        latency_per_image (float): 이미지 한 장당 흉내낼 추론 시간(초).
+        size (int): 리턴할 이미지의 크기.
+    """
+
+    def __init__(self, latency_per_image: float = 0.0, size: int = 512):
+        self.latency_per_image = latency_per_image
+        self.unet = StubUNet()
+        # 흰 배경 위에 원을 그려 rembg가 실제와 비슷한 일을 하도록 합니다.
+        image = Image.new("RGB", (size, size), (255, 255, 255))
+        pixels = image.load()
+        center, radius = size // 2, size // 3
+        for y in range(size):
+            for x in range(size):
+                if (x - center) ** 2 + (y - center) ** 2 < radius**2:
+                    pixels[x, y] = (250, 200, 30)
+        self.image = image
+
+    def to(self, device: str) -> "StubPipeline":
+        return self
+
+    def __call__(
+        self,
+        prompt: Union[str, List[str]],
+        num_images_per_prompt: Optional[int] = 1,
+        **kwargs,
+    ) -> SimpleNamespace:
+        num_prompts = 1 if isinstance(prompt, str) else len(prompt)
+        num_images = num_prompts * (num_images_per_prompt or 1)
+        time.sleep(self.latency_per_image * num_images)
+        return SimpleNamespace(images=[self.image.copy() for _ in range(num_images)])
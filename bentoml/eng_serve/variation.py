@@ -0,0 +1,128 @@
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional
+
+import torch
+
+
+@dataclass
+class StoredResult:
+    """**생성된 이미지 한 장을 다시 denoise하는 데 필요한 값입니다. (CPU에 저장)**"""
+
+    model: str
+    guidance_scale: float
+    latents: torch.Tensor  # (1, 4, h, w) decode 직전의 latent
+    prompt_embeds: torch.Tensor  # (1, 77, dim)
+    negative_prompt_embeds: torch.Tensor  # (1, 77, dim)
+
+
+class ResultStore:
+    """**이미지별 latent와 prompt embedding을 result_id로 저장하는 LRU입니다.**
+    runner 프로세스의 메모리에 저장되므로 runner가 재시작되면 사라집니다.
+    Args:
+        max_entries (int): 저장할 최대 이미지 개수.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, StoredResult]" = OrderedDict()
+
+    def add(
+        self,
+        model: str,
+        guidance_scale: float,
+        latents: torch.Tensor,
+        prompt_embeds: torch.Tensor,
+        negative_prompt_embeds: torch.Tensor,
+    ) -> List[str]:
+        """**latents의 이미지마다 result_id를 만들어 저장하고 그 목록을 리턴합니다.**
+        prompt_embeds가 여러 prompt의 embedding이라면 (num_prompts, 77, dim),
+        latents는 prompt마다 같은 개수의 이미지가 prompt 순서대로 있다고 봅니다.
+        """
+        latents = latents.cpu().split(1)
+        prompt_embeds = prompt_embeds.cpu().split(1)
+        negative_prompt_embeds = negative_prompt_embeds[:1].cpu()
+        images_per_prompt = max(1, len(latents) // len(prompt_embeds))
+        result_ids = []
+        with self._lock:
+            for i, latent in enumerate(latents):
+                result_id = uuid.uuid4().hex
+                self._entries[result_id] = StoredResult(
+                    model,
+                    guidance_scale,
+                    latent,
+                    prompt_embeds[i // images_per_prompt],
+                    negative_prompt_embeds,
+                )
+                result_ids.append(result_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result_ids
+
+    def get(self, result_id: str) -> Optional[StoredResult]:
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                self._entries.move_to_end(result_id)
+            return entry
+
+
+@torch.no_grad()
+def partial_denoise(
+    pipe,
+    entry: StoredResult,
+    strength: float,
+    num_inference_steps: int,
+    num_images: int,
+    generator: Optional[torch.Generator] = None,
+) -> torch.Tensor:
+    """**저장된 latent에 strength만큼 noise를 더한 뒤 남은 step만 denoise합니다.**
+    img2img와 같지만 VAE encode 없이 저장된 latent와 prompt embedding을 그대로 사용하므로,
+    비용은 txt2img의 약 strength배입니다.
+    Args:
+        pipe (StableDiffusionPipeline): unet과 scheduler를 사용할 pipeline.
+        entry (StoredResult): 원본 이미지의 latent와 prompt embedding.
+        strength (float): 0~1. 클수록 원본에서 많이 달라집니다.
+        num_inference_steps (int): strength가 1일 때의 step 수.
+        num_images (int): 만들 변형 이미지 개수.
+        generator (Optional[torch.Generator]): noise를 만들 generator.
+    Returns:
+        torch.Tensor: decode 직전의 (num_images, 4, h, w) latent.
+    """
+    device, dtype = pipe.device, pipe.unet.dtype
+    scheduler = pipe.scheduler
+    scheduler.set_timesteps(num_inference_steps, device=device)
+    # step × strength가 1보다 작아도 최소 한 step은 denoise합니다. (0이면 timesteps가 비어 add_noise가 실패합니다.)
+    init_timestep = min(max(1, int(num_inference_steps * strength)), num_inference_steps)
+    t_start = max(num_inference_steps - init_timestep, 0)
+    timesteps = scheduler.timesteps[t_start * scheduler.order :]
+
+    latents = entry.latents.to(device, dtype).repeat(num_images, 1, 1, 1)
+    noise = torch.randn(
+        latents.shape, generator=generator, device=device, dtype=latents.dtype
+    )
+    latents = scheduler.add_noise(latents, noise, timesteps[:1].repeat(num_images))
+
+    do_guidance = entry.guidance_scale > 1.0
+    prompt_embeds = entry.prompt_embeds.to(device, dtype).repeat(num_images, 1, 1)
+    if do_guidance:
+        negative_embeds = entry.negative_prompt_embeds.to(device, dtype)
+        prompt_embeds = torch.cat(
+            [negative_embeds.repeat(num_images, 1, 1), prompt_embeds]
+        )
+    for t in timesteps:
+        model_input = torch.cat([latents] * 2) if do_guidance else latents
+        model_input = scheduler.scale_model_input(model_input, t)
+        noise_pred = pipe.unet(
+            model_input, t, encoder_hidden_states=prompt_embeds
+        ).sample
+        if do_guidance:
+            noise_uncond, noise_text = noise_pred.chunk(2)
+            noise_pred = noise_uncond + entry.guidance_scale * (
+                noise_text - noise_uncond
+            )
+        latents = scheduler.step(noise_pred, t, latents).prev_sample
+    return latents
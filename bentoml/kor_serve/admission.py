@@ -0,0 +1,202 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, Dict, Optional
+
+import bentoml
+
+from cost import cost_class
+
+queue_depth_gauge = bentoml.metrics.Gauge(
+    name="admission_queue_depth",
+    documentation="Requests admitted to a runner queue (running + waiting)",
+    labelnames=["runner"],
+)
+queue_wait_histogram = bentoml.metrics.Histogram(
+    name="admission_queue_wait_seconds",
+    documentation="Time a request waited in the admission queue",
+    labelnames=["runner", "cost_class"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+rejected_counter = bentoml.metrics.Counter(
+    name="admission_rejected_total",
+    documentation="Requests rejected by admission control",
+    labelnames=["runner", "reason"],
+)
+
+
+class QueueFull(Exception):
+    """**큐가 가득 차 요청을 받을 수 없을 때 발생합니다.**
+    Args:
+        retry_after (int): 다시 시도하기까지 기다려야 하는 예상 시간(초).
+        reason (str): 거절 사유. (queue_full, client_limit)
+    """
+
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(f"{reason}, retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Ticket:
+    def __init__(self, client_id: str, cost: float):
+        self.client_id = client_id
+        self.cost = cost
+        self.enqueued_at = time.perf_counter()
+        self.granted = False
+
+
+class AdmissionQueue:
+    """**runner 앞에 두는 크기가 제한된 대기열입니다.**
+    동시에 runner를 호출하는 요청 수를 max_concurrency로 제한하고, 대기 중인 요청까지 합쳐
+    max_queue_depth를 넘으면 바로 QueueFull을 던집니다.
+    대기 중인 요청은 scheduling 설정에 따라 다음 순서로 실행됩니다.
+    - round_robin: 클라이언트별로 돌아가며 실행해 한 클라이언트가 큐를 독차지할 수 없습니다.
+    - sjf: 추정 비용이 작은 요청부터 실행합니다(shortest-job-first). 큰 요청이 굶지 않도록
+      기다린 시간(초) × aging_rate만큼 비용을 깎아 줍니다.
+    Args:
+        name (str): metric label로 사용할 runner 이름.
+        config (dict): serving.yaml의 admission 설정.
+    """
+
+    def __init__(self, name: str, config: Dict):
+        self.name = name
+        self.max_concurrency = config["max_concurrency"]
+        self.max_queue_depth = config["max_queue_depth"]
+        self.max_per_client = config["max_per_client"]
+        # 비용 1(512px 이미지 한 장, 30 step)당 처리 시간(초)의 지수이동평균.
+        # Retry-After 추정에 사용합니다.
+        self.seconds_per_image = config["initial_seconds_per_image"]
+        self.ewma_alpha = config["ewma_alpha"]
+        self.scheduling = config["scheduling"]
+        self.aging_rate = config["aging_rate"]
+        self._cond = threading.Condition()
+        self._waiting: "OrderedDict[str, Deque[_Ticket]]" = OrderedDict()
+        self._per_client: Dict[str, int] = {}
+        self._running = 0
+        self._depth = 0
+        self._queued_cost = 0.0
+
+    def retry_after(self) -> int:
+        """**지금 쌓여 있는 작업이 모두 처리될 때까지의 예상 시간(초)입니다.**"""
+        seconds = self._queued_cost * self.seconds_per_image / self.max_concurrency
+        return max(1, math.ceil(seconds))
+
+    def _reject(self, reason: str) -> QueueFull:
+        rejected_counter.labels(runner=self.name, reason=reason).inc()
+        return QueueFull(self.retry_after(), reason)
+
+    def _next_ticket(self) -> _Ticket:
+        if self.scheduling == "sjf":
+            # 각 클라이언트의 대기 요청 중 기다린 시간을 반영한 비용이 가장 작은 요청을 고릅니다.
+            now = time.perf_counter()
+            ticket = min(
+                (ticket for tickets in self._waiting.values() for ticket in tickets),
+                key=lambda t: t.cost - self.aging_rate * (now - t.enqueued_at),
+            )
+            tickets = self._waiting[ticket.client_id]
+            tickets.remove(ticket)
+            if not tickets:
+                del self._waiting[ticket.client_id]
+            return ticket
+        # 맨 앞 클라이언트의 요청을 하나 꺼내고, 남은 요청이 있으면 그 클라이언트를 맨 뒤로 보냅니다.
+        client_id, tickets = self._waiting.popitem(last=False)
+        ticket = tickets.popleft()
+        if tickets:
+            self._waiting[client_id] = tickets
+        return ticket
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_concurrency and self._waiting:
+            ticket = self._next_ticket()
+            ticket.granted = True
+            self._running += 1
+            queue_wait_histogram.labels(
+                runner=self.name, cost_class=cost_class(ticket.cost)
+            ).observe(time.perf_counter() - ticket.enqueued_at)
+        self._cond.notify_all()
+
+    def _enter(self, client_id: str, cost: float) -> _Ticket:
+        with self._cond:
+            if self._depth >= self.max_queue_depth:
+                raise self._reject("queue_full")
+            if self._per_client.get(client_id, 0) >= self.max_per_client:
+                raise self._reject("client_limit")
+            ticket = _Ticket(client_id, cost)
+            self._waiting.setdefault(client_id, deque()).append(ticket)
+            self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+            self._depth += 1
+            self._queued_cost += cost
+            queue_depth_gauge.labels(runner=self.name).set(self._depth)
+            self._dispatch()
+            while not ticket.granted:
+                self._cond.wait()
+        return ticket
+
+    def _leave(self, ticket: _Ticket, elapsed: Optional[float]) -> None:
+        with self._cond:
+            self._running -= 1
+            self._depth -= 1
+            self._queued_cost -= ticket.cost
+            self._per_client[ticket.client_id] -= 1
+            if not self._per_client[ticket.client_id]:
+                del self._per_client[ticket.client_id]
+            if elapsed is not None:
+                per_image = elapsed / ticket.cost if ticket.cost else elapsed
+                self.seconds_per_image += self.ewma_alpha * (
+                    per_image - self.seconds_per_image
+                )
+            queue_depth_gauge.labels(runner=self.name).set(self._depth)
+            self._dispatch()
+
+    @contextmanager
+    def admit(self, client_id: str, cost: float):
+        """**차례가 올 때까지 기다린 뒤 with 블록을 실행합니다.**
+        Args:
+            client_id (str): 공정하게 순서를 나눌 클라이언트 식별자.
+            cost (float): cost.estimate_cost로 추정한 요청의 비용.
+        Raises:
+            QueueFull: 큐가 가득 찼거나 클라이언트의 동시 요청 수가 한도를 넘은 경우.
+        """
+        ticket = self._enter(client_id, cost)
+        start = time.perf_counter()
+        elapsed = None
+        try:
+            yield
+            elapsed = time.perf_counter() - start
+        finally:
+            # 실패한 호출은 처리 시간 추정에 반영하지 않습니다.
+            self._leave(ticket, elapsed)
+
+    @asynccontextmanager
+    async def admit_async(self, client_id: str, cost: float):
+        """**admit의 async 버전입니다. 차례를 기다리는 동안 event loop를 막지 않습니다.**
+        async 경로에서는 with 블록 안에서 runner.<method>.async_run을 await해야 합니다.
+        Args:
+            client_id (str): 공정하게 순서를 나눌 클라이언트 식별자.
+            cost (float): cost.estimate_cost로 추정한 요청의 비용.
+        Raises:
+            QueueFull: 큐가 가득 찼거나 클라이언트의 동시 요청 수가 한도를 넘은 경우.
+        """
+        loop = asyncio.get_running_loop()
+        entering = loop.run_in_executor(None, self._enter, client_id, cost)
+        try:
+            ticket = await asyncio.shield(entering)
+        except asyncio.CancelledError:
+            # 기다리는 동안 취소되면, 나중에 받은 자리를 바로 돌려줍니다.
+            def release(future: asyncio.Future) -> None:
+                if not future.cancelled() and future.exception() is None:
+                    self._leave(future.result(), None)
+
+            entering.add_done_callback(release)
+            raise
+        start = time.perf_counter()
+        elapsed = None
+        try:
+            yield
+            elapsed = time.perf_counter() - start
+        finally:
+            self._leave(ticket, elapsed)
@@ -0,0 +1,24 @@
+import threading
+
+from PIL import Image
+from rembg import new_session, remove
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def rembg_session():
+    """**프로세스에서 공유하는 rembg(u2net) session을 리턴합니다.**
+    remove()에 session을 넘기지 않으면 호출할 때마다 ONNX 모델을 새로 불러오므로,
+    처음 호출할 때 한 번만 만들어 재사용합니다.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = new_session("u2net")
+        return _session
+
+
+def remove_background(image: Image.Image) -> Image.Image:
+    """**image의 배경을 지운 RGBA 이미지를 리턴합니다.**"""
+    return remove(image, session=rembg_session())
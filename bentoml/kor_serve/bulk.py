@@ -0,0 +1,32 @@
+import math
+from typing import Dict, List
+
+from cost import estimate_cost
+
+
+def dedupe_prompts(prompts: List[str]) -> Dict[str, List[int]]:
+    """**중복된 prompt를 합쳐, prompt마다 요청 안에서의 위치(index) 목록을 리턴합니다.**
+    앞뒤 공백만 다른 prompt는 같은 prompt로 보며, 처음 나온 순서를 유지합니다.
+    """
+    indices: Dict[str, List[int]] = {}
+    for index, prompt in enumerate(prompts):
+        indices.setdefault(prompt.strip(), []).append(index)
+    return indices
+
+
+def bulk_batch_size(
+    num_inference_steps: int, max_batch_size: int, max_cost: float
+) -> int:
+    """**한 번의 pipeline 호출에 넣을 수 있는 가장 큰 prompt 개수를 리턴합니다.**
+    Args:
+        num_inference_steps (int): 추론 스텝.
+        max_batch_size (int): serving.yaml의 bulk.max_batch_size. (GPU 메모리 한도)
+        max_cost (float): serving.yaml의 policy.max_cost. 한 batch의 비용이 이 값을 넘지 않게 합니다.
+    """
+    per_image = estimate_cost(num_inference_steps, 1)
+    return max(1, min(max_batch_size, math.floor(max_cost / per_image)))
+
+
+def split_batches(items: List[str], batch_size: int) -> List[List[str]]:
+    """**items를 batch_size개씩 나눕니다. 마지막 batch만 작을 수 있습니다.**"""
+    return [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
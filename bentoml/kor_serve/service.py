@@ -3,18 +3,41 @@ from torch import autocast
 from diffusers import StableDiffusionPipeline, DEISMultistepScheduler
 
 import bentoml
-from PIL import Image
+import PIL.Image as PILImage
+from bentoml.exceptions import RemoteException
 from bentoml.io import Image, JSON
 from pydantic import BaseModel
-from fastapi import FastAPI, Response
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 
+import asyncio
 import base64
+import json
+import time
+from functools import partial
 from io import BytesIO
-from typing import Optional
+from typing import List, Optional
 
-from rembg import remove
+from admission import AdmissionQueue, QueueFull
+from bulk import bulk_batch_size, dedupe_prompts, split_batches
+from client_id import client_id_from_headers, client_id_from_request
+from background import remove_background
+from attention import apply_attention_backend, select_attention_backend
+from coalescing import RequestCoalescer
+from compiled_unet import compile_unet
+from cost import estimate_cost
+from policy import PolicyViolation, RequestPolicy
+from prompt_cache import EmbeddingCache, encode_text
+from runner_pool import PipelineWorker, RunnerPool, RunnerWorker
+from serving_config import load_serving_config
+from stage_timer import STAGE_HEADER, StageTimer, instrument_pipeline
+from stub_pipeline import StubPipeline
+from variation import ResultStore, partial_denoise
+from vae_decode import install_tiled_decode
 
-server_check = 0
+serving_config = load_serving_config()
+# runner가 /health의 readiness 확인에 이 시간(초) 안에 답하지 않으면 준비되지 않은 것으로 봅니다.
+HEALTH_CHECK_TIMEOUT = 2
 fastapi_app = FastAPI()
 
 
@@ -28,6 +51,9 @@ class UserInput(BaseModel):
         size: Optional[int] = 512 <- 이미지 사이즈 설정
         num_inference_steps: Optional[int] = 30 <- 추론 스텝 조정
         num_images_per_prompt: Optional[int] = 1 <- 출력할 이미지의 개수
+        seed: Optional[int] = None <- 생성에 사용할 seed, 없으면 매번 다른 이미지가 생성됩니다.
+        negative_prompt: Optional[str] = None <- 이미지에서 피하고 싶은 내용. ex) "low quality"
+        remove_background: Optional[bool] = True <- False라면 removes를 만들지 않습니다.
     """
 
     model: str = "openmoji"  # 사용할 모델의 이름
@@ -36,16 +62,147 @@ class UserInput(BaseModel):
     size: Optional[int] = 512
     num_inference_steps: Optional[int] = 30
     num_images_per_prompt: Optional[int] = 1
+    seed: Optional[int] = None
+    negative_prompt: Optional[str] = None
+    remove_background: Optional[bool] = True
+
+
+class VariationInput(BaseModel):
+    """**이전에 생성한 이미지를 변형하는 Request입니다.**
+    Args:
+        result_id: str <- 변형할 이미지의 result_id (txt2img 응답의 result_ids 중 하나)
+        strength: Optional[float] = 0.5 <- 0~1, 클수록 원본과 많이 달라집니다.
+        num_inference_steps: Optional[int] = 30 <- strength가 1일 때의 추론 스텝
+        num_images_per_prompt: Optional[int] = 1 <- 출력할 이미지의 개수
+        size: Optional[int] = 512 <- 이미지 사이즈 설정
+        seed: Optional[int] = None <- noise에 사용할 seed
+        remove_background: Optional[bool] = True <- False라면 removes를 만들지 않습니다.
+    """
+
+    result_id: str
+    strength: Optional[float] = 0.5
+    num_inference_steps: Optional[int] = 30
+    num_images_per_prompt: Optional[int] = 1
+    size: Optional[int] = 512
+    seed: Optional[int] = None
+    remove_background: Optional[bool] = True
+
+
+class BulkInput(BaseModel):
+    """**여러 prompt를 같은 설정으로 한 번에 생성하는 Request입니다. (스티커 세트)**
+    Args:
+        model: str = "openmoji" <- 사용할 모델의 이름
+        prompts: List[str] <- 생성할 prompt 목록. 중복된 prompt는 한 번만 생성합니다.
+        guidance_scale, size, num_inference_steps, seed, negative_prompt, remove_background
+        <- UserInput과 같습니다.
+    """
+
+    model: str = "openmoji"
+    prompts: List[str]
+    guidance_scale: Optional[float] = 15
+    size: Optional[int] = 512
+    num_inference_steps: Optional[int] = 30
+    seed: Optional[int] = None
+    negative_prompt: Optional[str] = None
+    remove_background: Optional[bool] = True
+
+
+def to_base64(image: Image) -> str:
+    """**Image 리스트를 Json형태로 보내기 위해 Base64포맷으로 전환합니다.**
+    Args:
+        image (Image): Json형태로 전환할 이미지.
+    Returns:
+        str: Base64형태로 전환된 문자열.
+    """
+    with BytesIO() as output:
+        image.save(output, format="PNG")
+        return base64.b64encode(output.getvalue()).decode("utf-8")
+
+
+def resolve_device() -> str:
+    """**이 runner worker에서 pipeline을 올릴 device를 리턴합니다.**
+    BentoML은 runner worker마다 GPU 하나만 보이도록 CUDA_VISIBLE_DEVICES를 설정하므로
+    보이는 첫 GPU(cuda:0)를 사용하고, GPU가 없다면 cpu를 사용합니다.
+    """
+    return "cuda:0" if torch.cuda.is_available() else "cpu"
 
 
 class StableDiffusionRunnable(bentoml.Runnable):
-    SUPPORTED_RESOURCES = ("nvidia.com/gpu",)
+    SUPPORTED_RESOURCES = ("nvidia.com/gpu", "cpu")
     SUPPORTS_CPU_MULTI_THREADING = True
 
     def __init__(self):
+        self.__name__ = "Stable_Diffusion_Runnable"
+        self.stage_timing = serving_config["stage_timing"]
+        # BentoML은 runner의 메서드를 하나씩 실행하므로 runner마다 pipeline을 하나만 올립니다.
+        # 여러 GPU는 runner_pool.runners개의 runner가 나눠 맡고, API 서버가 요청을 나눠 보냅니다.
+        # GPU 없이 서빙 경로만 벤치마크할 때(stub_pipeline)는 cpu를 사용합니다.
+        device = "cpu" if serving_config["stub_pipeline"] else resolve_device()
+        self.worker = PipelineWorker(
+            "worker-0", device, self.load_pipeline(device), "openmoji"
+        )
+        # negative prompt embedding cache입니다. (꺼져 있으면 저장 없이 매번 계산)
+        self.text_cache: Optional[EmbeddingCache] = None
+        if not serving_config["stub_pipeline"]:
+            worker = self.worker
+            # serving.yaml의 attention 설정에 맞는(auto라면 가장 빠른) backend를 적용합니다.
+            worker.attention_backend = select_attention_backend(
+                worker.pipe, serving_config["attention"]
+            )
+            print(f"{worker.name}: attention backend {worker.attention_backend}")
+            # attention backend가 정해진 뒤에 자주 쓰는 batch 크기로 UNet을 미리 컴파일합니다.
+            compile_unet(worker.pipe, serving_config["compile"])
+            cache_config = serving_config["negative_prompt_cache"]
+            self.text_cache = EmbeddingCache(
+                worker.pipe,
+                cache_config["max_entries"] if cache_config["enabled"] else 0,
+            )
+            for text in cache_config["preload"]:
+                self.text_cache.get(text)
+        # variation에서 다시 쓸 수 있도록 생성한 이미지의 latent를 저장합니다.
+        self.result_store = None
+        store_config = serving_config["result_store"]
+        if store_config["enabled"] and not serving_config["stub_pipeline"]:
+            self.result_store = ResultStore(store_config["max_entries"])
+        if serving_config["warmup"]["enabled"]:
+            self.warmup()
+
+    def warmup(self) -> None:
+        """**설정된 LoRA와 이미지 크기로 짧은 생성을 한 번씩 실행합니다.**
+        CUDA context 초기화, kernel autotuning, LoRA 로딩, rembg 모델 로딩을 첫 요청 전에 끝내 둡니다.
+        __init__이 끝나야 runner가 ready가 되므로, warmup이 끝나기 전에는 /health가 503을 리턴합니다.
+        """
+        config = serving_config["warmup"]
+        start = time.perf_counter()
+        for adapter in config["adapters"]:
+            for size in config["sizes"]:
+                warmup_input = UserInput(
+                    model=adapter,
+                    prompt="warmup",
+                    size=size,
+                    num_inference_steps=config["num_inference_steps"],
+                )
+                self.generate(warmup_input)
+        # 마지막으로 기본 LoRA를 다시 적용해 둡니다.
+        self.generate(
+            UserInput(
+                prompt="warmup", num_inference_steps=config["num_inference_steps"]
+            )
+        )
+        print(f"{self.worker.name} warmup 완료: {time.perf_counter() - start:.1f}초")
+
+    def load_pipeline(self, device: str):
+        """**device에 txt2img pipeline을 올려 리턴합니다.**
+        Args:
+            device (str): pipeline을 올릴 device. ex) cuda:0
+        Returns:
+            StableDiffusionPipeline: models/openmoji LoRA가 적용된 pipeline.
+            serving.yaml의 stub_pipeline이 켜져 있다면 StubPipeline을 리턴합니다.
+        """
+        if serving_config["stub_pipeline"]:
+            return StubPipeline(serving_config["stub_latency_per_image"])
         pretrained_model_path = "BAAI/AltDiffusion-m9"
         ckpt_path = "models/openmoji"
-        self.device = "cuda"
         txt2img_pipe = StableDiffusionPipeline.from_pretrained(
             pretrained_model_path,
             torch_dtype=torch.float16,
@@ -54,8 +211,12 @@ class StableDiffusionRunnable(bentoml.Runnable):
         txt2img_pipe.scheduler = DEISMultistepScheduler.from_config(
             txt2img_pipe.scheduler.config
         )
-        self.txt2img_pipe = txt2img_pipe.to(self.device)
-        self.__name__ = "Stable_Diffusion_Runnable"
+        txt2img_pipe = txt2img_pipe.to(device)
+        # 여러 장의 latent를 나눠서 decode해 최대 메모리 사용량을 줄입니다.
+        install_tiled_decode(txt2img_pipe, serving_config["vae_decode"])
+        if self.stage_timing["enabled"]:
+            instrument_pipeline(txt2img_pipe)
+        return txt2img_pipe
 
     @bentoml.Runnable.method(batchable=False, batch_dim=0)
     def txt2img(self, input_data: JSON) -> dict:
@@ -66,62 +227,245 @@ class StableDiffusionRunnable(bentoml.Runnable):
             dict: base64형태로 인코딩된 이미지정보가 담긴 dict을 리턴합니다.
             이 dict는 자동으로 JSON으로 변환되어 Response하게 됩니다.
         """
-        global server_check
-        # 현재 gpu가 사용중으로 상태 변경.
-        server_check = 1
-        # model 변경 하기.
-        print(f"{input_data.model}을 적용합니다.")
-        self.txt2img_pipe.unet.load_attn_procs(f"models/{input_data.model}")
-        prompt = input_data.prompt
-        guidance_scale = input_data.guidance_scale
-        size = input_data.size
-        num_inference_steps = input_data.num_inference_steps
-        num_images_per_prompt = input_data.num_images_per_prompt
-        with autocast(self.device):
-            images = self.txt2img_pipe(
-                prompt=prompt,
-                guidance_scale=guidance_scale,
-                num_inference_steps=num_inference_steps,
-                num_images_per_prompt=num_images_per_prompt,
-            ).images
-
-        def to_base64(image: Image) -> str:
-            """**Image 리스트를 Json형태로 보내기 위해 Base64포맷으로 전환합니다.**
-            Args:
-                image (Image): Json형태로 전환할 이미지.
-            Returns:
-                str: Base64형태로 전환된 문자열.
-            """
-            with BytesIO() as output:
-                image.save(output, format="PNG")
-                return base64.b64encode(output.getvalue()).decode("utf-8")
-
-        server_check = 0  # 서버가 사용가능함으로 전환.
+        return self.generate(input_data)
 
-        return {
-            "images": [
-                to_base64(image.resize((size, size))) for _, image in enumerate(images)
-            ],
-            "removes": [
-                to_base64(remove(image.resize((size, size))))
-                for _, image in enumerate(images)
-            ],
-        }
+    def prepare_worker(self, worker: PipelineWorker, model: str, timer: StageTimer):
+        """**worker에 model LoRA를 적용하고, timer가 worker의 GPU를 동기화하도록 합니다.**"""
+        if self.stage_timing["enabled"] and worker.device.startswith("cuda"):
+            # GPU 연산은 비동기이므로 단계가 끝날 때마다 동기화해야 시간이 정확합니다.
+            timer.synchronize = partial(torch.cuda.synchronize, worker.device)
+        # model 변경 하기. 이미 적용된 LoRA라면 다시 불러오지 않습니다.
+        if worker.active_adapter == model:
+            return
+        print(f"{worker.name}에 {model}을 적용합니다.")
+        with timer.stage("adapter_load"):
+            worker.pipe.unet.load_attn_procs(f"models/{model}")
+            if worker.attention_backend != "default":
+                # LoRA를 불러오면 attention processor가 바뀌므로 backend를 다시 적용합니다.
+                worker.attention_backend = apply_attention_backend(
+                    worker.pipe,
+                    worker.attention_backend,
+                    serving_config["attention"]["fallback"],
+                )
+        worker.active_adapter = model
 
+    def postprocess(
+        self,
+        images: list,
+        size: int,
+        timer: StageTimer,
+        with_removes: Optional[bool] = True,
+    ) -> dict:
+        """**생성된 이미지를 resize하고 배경을 지운 뒤 base64로 인코딩합니다.**
+        GPU를 쓰지 않으므로 worker를 반납한 뒤에 호출합니다.
+        with_removes가 False라면 배경을 지우지 않고 removes는 빈 리스트입니다.
+        """
+        with timer.stage("resize"):
+            images = [image.resize((size, size)) for image in images]
+        removes = []
+        if with_removes is not False:
+            with timer.stage("rembg"):
+                removes = [remove_background(image) for image in images]
+        with timer.stage("base64"):
+            return {
+                "images": [to_base64(image) for image in images],
+                "removes": [to_base64(image) for image in removes],
+            }
 
-# runner를 할당합니다.
-kor_emoji_diffusion_runner = bentoml.Runner(
-    StableDiffusionRunnable,
-    name="kor_stable_diffusion_runner",
-)
+    def finish(self, result: dict, timer: StageTimer) -> dict:
+        """**stage_timing.response_header가 켜져 있다면 단계별 소요시간을 result에 담습니다.**"""
+        if self.stage_timing["enabled"] and self.stage_timing["response_header"]:
+            result["timings"] = timer.to_header()
+        return result
+
+    @bentoml.Runnable.method(batchable=False)
+    def txt2img_batch(self, input_data: UserInput, prompts: List[str]) -> dict:
+        """**여러 prompt를 input_data의 설정으로 한 번의 pipeline 호출에서 생성합니다.**
+        Args:
+            input_data (UserInput): prompt를 제외한 생성 설정. num_images_per_prompt는 1로 봅니다.
+            prompts (List[str]): 한 batch로 생성할 prompt 목록.
+        Returns:
+            dict: txt2img와 같은 형태이며, 각 리스트는 prompts의 순서를 따릅니다.
+        """
+        return self.generate(
+            input_data.copy(update={"num_images_per_prompt": 1}), prompts=prompts
+        )
+
+    def generate(
+        self, input_data: UserInput, prompts: Optional[List[str]] = None
+    ) -> dict:
+        """**input_data로 이미지를 생성해 base64로 인코딩한 dict를 리턴합니다.**
+        Args:
+            input_data (UserInput): 유저의 인풋입니다.
+            prompts (Optional[List[str]]): input_data.prompt 대신 한 batch로 생성할 prompt 목록.
+        """
+        prompts = prompts or [input_data.prompt]
+        result_ids = None
+        worker = self.worker
+        timer = StageTimer(self.stage_timing["enabled"])
+        with timer:
+            with worker.lock:
+                self.prepare_worker(worker, input_data.model, timer)
+                guidance_scale = input_data.guidance_scale
+                num_inference_steps = input_data.num_inference_steps
+                num_images_per_prompt = input_data.num_images_per_prompt
+                generator = None
+                if input_data.seed is not None and len(prompts) == 1:
+                    generator = torch.Generator(worker.device).manual_seed(
+                        input_data.seed
+                    )
+                elif input_data.seed is not None:
+                    # prompt마다 같은 seed의 generator를 두어 /kor_submit과 같은 이미지가 나오도록 합니다.
+                    generator = [
+                        torch.Generator(worker.device).manual_seed(input_data.seed)
+                        for _ in prompts
+                    ]
+                # 마지막 step이 끝난 latent를 variation에서 다시 쓰기 위해 받아 둡니다.
+                final_latents = []
+
+                def keep_latents(step: int, timestep: int, latents: torch.Tensor):
+                    final_latents[:] = [latents]
+
+                text_cache = self.text_cache
+                with timer.stage("pipeline"), autocast(worker.device.split(":")[0]):
+                    if text_cache is None:
+                        negative_prompt = input_data.negative_prompt
+                        text_kwargs = {
+                            "prompt": prompts,
+                            "negative_prompt": negative_prompt
+                            and [negative_prompt] * len(prompts),
+                        }
+                    else:
+                        with timer.stage("text_encode"):
+                            text_kwargs = {
+                                "prompt_embeds": encode_text(worker.pipe, prompts),
+                                "negative_prompt_embeds": text_cache.get(
+                                    input_data.negative_prompt or ""
+                                ).repeat(len(prompts), 1, 1),
+                            }
+                    images = worker.pipe(
+                        guidance_scale=guidance_scale,
+                        num_inference_steps=num_inference_steps,
+                        num_images_per_prompt=num_images_per_prompt,
+                        generator=generator,
+                        callback=keep_latents,
+                        **text_kwargs,
+                    ).images
+                # pipeline 시간에서 text encoding과 VAE decode를 뺀 나머지가 denoising 시간입니다.
+                timer.split("pipeline", "denoise", ("text_encode", "vae_decode"))
+                if self.result_store is not None and final_latents:
+                    result_ids = self.result_store.add(
+                        input_data.model,
+                        guidance_scale,
+                        final_latents[0],
+                        text_kwargs["prompt_embeds"],
+                        text_kwargs["negative_prompt_embeds"],
+                    )
+            timer.synchronize = None
+            result = self.postprocess(
+                images, input_data.size, timer, input_data.remove_background
+            )
+        if result_ids is not None:
+            result["result_ids"] = result_ids
+        return self.finish(result, timer)
+
+    @bentoml.Runnable.method(batchable=False)
+    def variation(self, input_data: VariationInput) -> dict:
+        """**이전에 생성한 이미지의 latent를 일부만 다시 denoise해 비슷한 이미지를 만듭니다.**
+        Args:
+            input_data (VariationInput): 원본 이미지의 result_id와 변형 정도(strength).
+        Returns:
+            dict: txt2img와 같은 형태의 dict. result_id를 찾을 수 없다면 error를 담아 리턴합니다.
+        """
+        entry = (
+            self.result_store.get(input_data.result_id) if self.result_store else None
+        )
+        if entry is None:
+            # BentoML이 이 runner의 worker를 여러 개 띄웠다면 다른 worker에 저장됐을 수도 있습니다.
+            return {
+                "error": f"result_id {input_data.result_id} is not stored on this runner worker"
+            }
+        worker = self.worker
+        timer = StageTimer(self.stage_timing["enabled"])
+        with timer:
+            with worker.lock:
+                self.prepare_worker(worker, entry.model, timer)
+                generator = None
+                if input_data.seed is not None:
+                    generator = torch.Generator(worker.device).manual_seed(
+                        input_data.seed
+                    )
+                with timer.stage("pipeline"), autocast(worker.device.split(":")[0]):
+                    latents = partial_denoise(
+                        worker.pipe,
+                        entry,
+                        input_data.strength,
+                        input_data.num_inference_steps,
+                        input_data.num_images_per_prompt,
+                        generator,
+                    )
+                    images = worker.pipe.numpy_to_pil(
+                        worker.pipe.decode_latents(latents)
+                    )
+                timer.split("pipeline", "denoise", ("vae_decode",))
+                result_ids = self.result_store.add(
+                    entry.model,
+                    entry.guidance_scale,
+                    latents,
+                    entry.prompt_embeds,
+                    entry.negative_prompt_embeds,
+                )
+            timer.synchronize = None
+            result = self.postprocess(
+                images, input_data.size, timer, input_data.remove_background
+            )
+        result["result_ids"] = result_ids
+        return self.finish(result, timer)
+
+
+# runner를 할당합니다. runner_pool.runners개의 runner가 GPU를 하나씩 맡습니다.
+kor_runners = [
+    bentoml.Runner(
+        StableDiffusionRunnable,
+        name="kor_stable_diffusion_runner" + (f"_{i}" if i else ""),
+    )
+    for i in range(serving_config["runner_pool"]["runners"])
+]
 # make service
-svc_kor = bentoml.Service("kor_emoji_diffusion", runners=[kor_emoji_diffusion_runner])
+svc_kor = bentoml.Service("kor_emoji_diffusion", runners=kor_runners)
 # fastapi와 포트를 연결할 수 있도록 마운트합니다.
 svc_kor.mount_asgi_app(fastapi_app)
+# 배포마다 정한 파라미터 한도와 비용 한도를 적용합니다.
+request_policy = RequestPolicy(serving_config["policy"])
+# 진행 중인 중복 요청을 runner 호출 하나로 합칩니다. 묶인 호출도 policy 한도를 넘지 않습니다.
+kor_coalescer = RequestCoalescer(
+    serving_config["coalescing"], request_policy.max_images_for
+)
+# 남은 작업이 가장 적은(LoRA가 이미 적용된) runner로 요청을 보냅니다.
+# remote runner의 오류는 RemoteException으로 오므로, policy로 입력을 검증한 뒤의 오류는 runner의 실패로 셉니다.
+kor_runner_pool = RunnerPool(
+    [RunnerWorker(runner.name, runner, "openmoji") for runner in kor_runners],
+    serving_config["runner_pool"],
+    failure_types=(RemoteException, asyncio.TimeoutError),
+)
+# runner 앞의 대기열 크기를 제한해 과부하 시 바로 429를 돌려줍니다.
+kor_admission = AdmissionQueue(
+    "kor_stable_diffusion_runner", serving_config["admission"]
+)
+# /kor_bulk에서 한 요청에 받을 prompt 개수와 한 batch의 크기 한도입니다.
+bulk_config = serving_config["bulk"]
+
+
+def client_id_of(ctx: bentoml.Context) -> str:
+    """**공정한 순서 분배에 사용할 클라이언트 식별자를 요청 헤더에서 찾습니다.**
+    BentoML의 ctx.request에는 연결한 주소가 없으므로 헤더가 없는 요청은 anonymous로 묶입니다.
+    """
+    return client_id_from_headers(ctx.request.headers)
+
 
 # 영어 텍스트인풋을 제공받는 path
 @svc_kor.api(input=JSON(pydantic_model=UserInput), output=JSON(), route="/kor_submit")
-def kor2img(input_data: JSON) -> JSON:
+def kor2img(input_data: JSON, ctx: bentoml.Context) -> JSON:
     """**클라이언트의 Request(prompt:kor)를 입력받아 생성된 이미지를 JSON형태로 리턴합니다.**\n
     Args:
         input_data (JSON): 사용자의 Request입니다. 다음과 같은 attribute가 존재합니다.
@@ -132,13 +476,253 @@ def kor2img(input_data: JSON) -> JSON:
         size: Optional[int] = 512
         num_inference_steps: Optional[int] = 30
         num_images_per_prompt: Optional[int] = 1
+        seed: Optional[int] = None
+        negative_prompt: Optional[str] = None
     \n
     Returns:
         JSON: Base64형태로 포매팅된 이미지를 JSON형태로 리턴합니다.
         attribute는 images, removes 두 개로 구성되어 있으며,
         value는 둘다 Base64형태로 포매팅된 문자열 리스트를 반환 합니다.
+        serving.yaml의 result_store가 켜져 있다면 이미지별 result_ids를 함께 돌려주며,
+        이 값으로 /kor_variation을 호출할 수 있습니다.
+        serving.yaml의 stage_timing.response_header가 켜져 있다면
+        단계별 소요시간(ms)을 X-Stage-Timings 헤더로 함께 돌려줍니다.
+        대기열이 가득 찼다면 status_code 429와 Retry-After 헤더를 돌려줍니다.
+        serving.yaml의 policy 한도를 넘는 값은 한도 안으로 줄이거나(clamp), 400으로 거절(reject)합니다.
+    """
+    try:
+        input_data = request_policy.apply(input_data)
+    except PolicyViolation as e:
+        ctx.response.status_code = 400
+        return {"error": str(e)}
+    client_id = client_id_of(ctx)
+
+    def call(data: UserInput) -> dict:
+        cost = estimate_cost(data.num_inference_steps, data.num_images_per_prompt)
+        with kor_admission.admit(client_id, cost):
+            with kor_runner_pool.acquire(data.model, cost) as worker:
+                result = worker.runner.txt2img.run(data)
+        return kor_runner_pool.tag_result_ids(worker, result)
+
+    try:
+        result = kor_coalescer.run(input_data, call)
+    except QueueFull as e:
+        ctx.response.status_code = 429
+        ctx.response.headers.append("Retry-After", str(e.retry_after))
+        return {"error": str(e)}
+    timings = result.pop("timings", None)
+    if timings is not None:
+        ctx.response.headers.append(STAGE_HEADER, timings)
+    return result
+
+
+@svc_kor.api(
+    input=JSON(pydantic_model=VariationInput), output=JSON(), route="/kor_variation"
+)
+def kor_variation(input_data: JSON, ctx: bentoml.Context) -> JSON:
+    """**이전에 생성한 이미지(result_id)를 strength만큼 변형한 이미지를 JSON형태로 리턴합니다.**\n
+    Args:
+        input_data (JSON): 사용자의 Request입니다. 다음과 같은 attribute를 사용할 수 있습니다.
+        result_id: str <- /kor_submit 응답의 result_ids 중 하나
+        strength: Optional[float] = 0.5
+        num_inference_steps: Optional[int] = 30
+        num_images_per_prompt: Optional[int] = 1
+        size: Optional[int] = 512
+        seed: Optional[int] = None
+    \n
+    Returns:
+        JSON: /kor_submit과 같은 형태(images, removes, result_ids)의 JSON을 리턴합니다.
+        result_id를 만든 runner로 요청을 보내며, 그 runner에 저장된 result_id가 아니라면
+        (runner가 재시작됐거나, 오래되어 지워졌거나, 그 runner의 다른 worker가 만든 경우) status_code 404를 돌려줍니다.
+    """
+    try:
+        input_data = request_policy.apply_variation(input_data)
+    except PolicyViolation as e:
+        ctx.response.status_code = 400
+        return {"error": str(e)}
+    # result_id를 만든 runner에만 latent가 저장되어 있으므로 그 runner로 보냅니다.
+    worker, result_id = kor_runner_pool.route_result_id(input_data.result_id)
+    if worker is None:
+        ctx.response.status_code = 404
+        return {"error": f"result_id {input_data.result_id} is not from this server"}
+    cost = estimate_cost(
+        input_data.num_inference_steps * input_data.strength,
+        input_data.num_images_per_prompt,
+    )
+    try:
+        with kor_admission.admit(client_id_of(ctx), cost):
+            with kor_runner_pool.acquire(None, cost, worker):
+                result = worker.runner.variation.run(
+                    input_data.copy(update={"result_id": result_id})
+                )
+    except QueueFull as e:
+        ctx.response.status_code = 429
+        ctx.response.headers.append("Retry-After", str(e.retry_after))
+        return {"error": str(e)}
+    if "error" in result:
+        ctx.response.status_code = 404
+        return {
+            "error": f"result_id {input_data.result_id} is not stored on {worker.name}. "
+            "It expired, the runner restarted, or another worker of the runner created it "
+            "(pin one GPU per runner in configuration.yaml)."
+        }
+    result = kor_runner_pool.tag_result_ids(worker, result)
+    timings = result.pop("timings", None)
+    if timings is not None:
+        ctx.response.headers.append(STAGE_HEADER, timings)
+    return result
+
+
+@svc_kor.api(
+    input=Image(),
+    output=Image(mime_type="image/png"),
+    route="/kor_remove_background",
+)
+def kor_remove_background(image: PILImage.Image) -> PILImage.Image:
+    """**이미지 한 장의 배경을 지워 PNG로 리턴합니다.**\n
+    /kor_submit에 remove_background=False를 보내고, 사용자가 고른 이미지만 필요할 때 이 경로로 보냅니다.
+    GPU를 쓰지 않으므로 runner가 아닌 API 서버 프로세스에서 실행합니다.
+    policy.max_size보다 큰 이미지는 max_size로 줄인 뒤 배경을 지웁니다.
+    \n
+    Args:
+        image (Image): 배경을 지울 이미지. (PNG bytes 또는 multipart)
+    Returns:
+        Image: 배경이 투명한 RGBA PNG.
+    """
+    max_size = request_policy.max_size
+    if max(image.size) > max_size:
+        image.thumbnail((max_size, max_size))
+    return remove_background(image)
+
+
+@fastapi_app.post("/kor_stream")
+async def kor_stream(input_data: UserInput, request: Request) -> Response:
+    """**이미지를 한 장씩 생성해, 끝나는 대로 한 장씩 스트리밍합니다.**
+    num_images_per_prompt장을 한 번에 생성하는 /kor_submit과 달리, 이미지마다 runner를 따로 호출하므로
+    첫 이미지를 받는 시간이 크게 줄어듭니다. (전체 시간은 batch로 생성할 때보다 조금 늘어납니다.)
+    seed가 있다면 i번째 이미지는 seed + i로 생성합니다.
+    \n
+    Returns:
+        (StreamingResponse): 한 줄에 JSON 하나(NDJSON)로, 이미지마다
+        {"index", "image", "remove", "result_id"}를 생성이 끝난 순서대로 보냅니다.
+        대기열이 가득 찬 이미지는 {"index", "error", "retry_after"}를 보냅니다.
+        policy를 어기면 status_code 400을 리턴합니다.
+    """
+    try:
+        input_data = request_policy.apply(input_data)
+    except PolicyViolation as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    client_id = client_id_from_request(request)
+    cost = estimate_cost(input_data.num_inference_steps, 1)
+
+    async def call(index: int) -> dict:
+        seed = input_data.seed
+        data = input_data.copy(
+            update={
+                "num_images_per_prompt": 1,
+                "seed": None if seed is None else seed + index,
+            }
+        )
+        try:
+            async with kor_admission.admit_async(client_id, cost):
+                with kor_runner_pool.acquire(data.model, cost) as worker:
+                    result = await worker.runner.txt2img.async_run(data)
+            result = kor_runner_pool.tag_result_ids(worker, result)
+        except QueueFull as e:
+            return {"index": index, "error": str(e), "retry_after": e.retry_after}
+        return {
+            "index": index,
+            "image": result["images"][0],
+            "remove": (result["removes"] or [None])[0],
+            "result_id": (result.get("result_ids") or [None])[0],
+        }
+
+    async def stream():
+        # async 경로이므로 runner는 async_run으로 호출합니다.
+        # (remote runner의 run은 AnyIO worker thread에서만 호출할 수 있습니다.)
+        calls = [call(index) for index in range(input_data.num_images_per_prompt)]
+        for future in asyncio.as_completed(calls):
+            yield json.dumps(await future) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@fastapi_app.post("/kor_bulk")
+def kor_bulk(input_data: BulkInput, request: Request) -> Response:
+    """**여러 prompt를 가능한 큰 batch로 묶어 생성하고, batch가 끝날 때마다 결과를 스트리밍합니다.**
+    \n
+    Returns:
+        (StreamingResponse): 한 줄에 JSON 하나(NDJSON)로, 중복을 합친 prompt마다
+        {"prompt", "indices", "image", "remove", "result_id"}를 생성이 끝난 순서대로 보냅니다.
+        indices는 요청의 prompts에서 그 prompt가 있던 위치들입니다.
+        대기열이 가득 차면 남은 prompt의 indices와 error, retry_after를 담은 줄을 보내고 끝납니다.
+        prompt 개수가 bulk.max_prompts를 넘거나 policy를 어기면 status_code 400을 리턴합니다.
     """
-    return kor_emoji_diffusion_runner.txt2img.run(input_data)
+    if not input_data.prompts or len(input_data.prompts) > bulk_config["max_prompts"]:
+        return JSONResponse(
+            {"error": f"prompts must have 1 to {bulk_config['max_prompts']} items"},
+            status_code=400,
+        )
+    base = UserInput(
+        **input_data.dict(exclude={"prompts"}), prompt="", num_images_per_prompt=1
+    )
+    try:
+        # prompt마다 policy를 적용하고(길이 제한), 자른 뒤의 prompt로 중복을 합칩니다.
+        policed = [
+            request_policy.apply(base.copy(update={"prompt": prompt}))
+            for prompt in input_data.prompts
+        ]
+    except PolicyViolation as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    base = policed[0].copy(update={"prompt": ""})
+    indices = dedupe_prompts([data.prompt for data in policed])
+    batch_size = bulk_batch_size(
+        base.num_inference_steps, bulk_config["max_batch_size"], request_policy.max_cost
+    )
+    client_id = client_id_from_request(request)
+
+    def stream():
+        batches = split_batches(list(indices), batch_size)
+        for i, prompts in enumerate(batches):
+            cost = estimate_cost(base.num_inference_steps, len(prompts))
+            try:
+                with kor_admission.admit(client_id, cost):
+                    with kor_runner_pool.acquire(base.model, cost) as worker:
+                        result = worker.runner.txt2img_batch.run(base, prompts)
+                result = kor_runner_pool.tag_result_ids(worker, result)
+            except QueueFull as e:
+                remaining = [p for batch in batches[i:] for p in batch]
+                yield json.dumps(
+                    {
+                        "error": str(e),
+                        "retry_after": e.retry_after,
+                        "indices": sorted(j for p in remaining for j in indices[p]),
+                    }
+                ) + "\n"
+                return
+            result_ids = result.get("result_ids") or [None] * len(prompts)
+            # remove_background가 False라면 removes가 비어 있습니다.
+            removes = result["removes"] or [None] * len(prompts)
+            for prompt, image, remove_image, result_id in zip(
+                prompts, result["images"], removes, result_ids
+            ):
+                yield json.dumps(
+                    {
+                        "prompt": prompt,
+                        "indices": indices[prompt],
+                        "image": image,
+                        "remove": remove_image,
+                        "result_id": result_id,
+                    }
+                ) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@fastapi_app.get("/pool")
+async def pool() -> list:
+    """**API 서버에서 본 runner별 상태(healthy, 남은 작업, 마지막으로 보낸 LoRA)를 리턴합니다.**"""
+    return kor_runner_pool.status()
 
 
 @fastapi_app.get("/health")
@@ -147,11 +731,28 @@ async def check() -> Response:
     \n
     Returns:
         (Response): 현재 서버의 상태입니다.
-        서버가 현재 추론중이라면 status_code 503을,
+        runner가 아직 준비(warmup)되지 않았거나, 모든 runner가 추론중이거나 unhealthy라면 status_code 503을,
         서버가 사용 가능하다면 200을 리턴합니다.
     """
+    # BentoML의 /readyz처럼 runner handle의 readiness만 확인합니다.
+    # runner 메서드는 생성 요청 뒤에 줄을 서므로 호출하지 않고, 추론중인지는 API 서버의 pool로 판단합니다.
+    try:
+        ready = await asyncio.wait_for(
+            asyncio.gather(
+                *(runner.runner_handle_is_ready() for runner in kor_runners)
+            ),
+            timeout=HEALTH_CHECK_TIMEOUT,
+        )
+    except Exception:
+        ready = [False]
+    if not all(ready):
+        return Response(content="runner is not ready", status_code=503)
+    available = any(
+        worker["healthy"] and not worker["outstanding"]
+        for worker in kor_runner_pool.status()
+    )
     return (
         Response(content="inference is available", status_code=200)
-        if not server_check
+        if available
         else Response(status_code=503)
     )
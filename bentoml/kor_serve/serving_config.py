@@ -0,0 +1,173 @@
+import os
+from copy import deepcopy
+from typing import Any, Dict, Optional
+
+import yaml
+
+# serving.yaml에 값이 없을 때 사용하는 기본 설정입니다.
+DEFAULT_CONFIG: Dict[str, Any] = {
+    # True라면 GPU 모델 대신 고정된 이미지를 리턴하는 CPU stub pipeline을 사용합니다. (벤치마크용)
+    "stub_pipeline": False,
+    # stub pipeline이 이미지 한 장당 흉내낼 추론 시간(초)입니다.
+    "stub_latency_per_image": 0.0,
+    "stage_timing": {
+        # txt2img의 단계별 소요시간을 Prometheus histogram으로 내보냅니다.
+        "enabled": True,
+        # True라면 단계별 소요시간(ms)을 X-Stage-Timings 응답 헤더로 돌려줍니다. (디버깅용)
+        "response_header": False,
+    },
+    "coalescing": {
+        # seed와 파라미터가 모두 같은 진행 중인 요청은 runner 호출 하나를 공유합니다.
+        "enabled": True,
+        # seed가 없는 같은 프롬프트 요청들을 num_images_per_prompt를 합친 호출 하나로 묶습니다.
+        "fold_unseeded": False,
+        # 묶을 요청을 기다리는 시간(초)입니다.
+        "fold_window": 0.05,
+        # 한 호출로 묶을 수 있는 최대 이미지 개수입니다. policy의 이미지 개수와 비용 한도로 다시 자릅니다.
+        "max_folded_images": 4,
+    },
+    "admission": {
+        # 아래 한도는 모두 API 서버 프로세스(API worker)마다 적용됩니다. (configuration.yaml의 api_server.workers)
+        # 동시에 runner를 호출할 수 있는 요청 수입니다.
+        "max_concurrency": 1,
+        # 실행 중인 요청과 대기 중인 요청을 합친 최대 개수, 넘으면 429를 돌려줍니다.
+        "max_queue_depth": 16,
+        # 클라이언트 하나가 동시에 큐에 넣을 수 있는 최대 요청 수입니다.
+        "max_per_client": 4,
+        # 처리 시간을 측정하기 전 사용할 이미지 한 장(512px, 30 step)당 처리 시간(초)입니다.
+        "initial_seconds_per_image": 3.0,
+        "ewma_alpha": 0.2,
+        # 대기 중인 요청의 실행 순서. sjf(작은 작업 먼저) 또는 round_robin(클라이언트별 순서)
+        "scheduling": "sjf",
+        # sjf에서 기다린 1초마다 깎아 주는 비용입니다. 클수록 FIFO에 가까워집니다.
+        "aging_rate": 0.1,
+    },
+    "policy": {
+        # 한도를 넘는 요청을 clamp(한도 안으로 줄이기)할지 reject(400으로 거절)할지 정합니다.
+        "mode": "clamp",
+        # models/ 폴더에 있는 LoRA 중 사용할 수 있는 것. 비어 있으면 검사하지 않습니다.
+        "allowed_models": ["openmoji", "notoemoji"],
+        "max_prompt_length": 300,
+        "min_size": 64,
+        "max_size": 1024,
+        "max_inference_steps": 50,
+        "max_images_per_prompt": 4,
+        "max_guidance_scale": 50,
+        # 요청 하나의 최대 비용입니다. (1 = 512px 이미지 한 장, 30 step)
+        "max_cost": 4.0,
+    },
+    "runner_pool": {
+        # 띄울 runner 개수입니다. runner마다 pipeline을 하나 올리고, API 서버가 남은 작업이 가장 적은 runner로 보냅니다.
+        # BentoML runner는 메서드를 하나씩 실행하므로 GPU마다 runner를 하나씩 두고,
+        # configuration.yaml에서 runner마다 GPU를 하나씩 지정합니다.
+        # runner를 늘렸다면 admission.max_concurrency도 runner 수만큼 늘려야 합니다.
+        "runners": 1,
+        # LoRA가 이미 적용된 runner의 남은 작업이 이만큼 더 많아도 그 runner를 고릅니다.
+        "affinity_slack": 1.0,
+        # 연속으로 이만큼 실패한 runner는 더 이상 요청을 받지 않습니다.
+        "max_failures": 3,
+        # unhealthy가 된 runner에 이만큼(초) 지난 뒤 다시 요청을 보내 회복을 확인합니다.
+        "recovery_seconds": 60,
+    },
+    "vae_decode": {
+        # pipeline의 VAE decode를 나눠서 실행해 최대 메모리 사용량을 줄입니다.
+        "enabled": True,
+        # VAE decoder에 한 번에 넣을 latent 개수입니다.
+        "batch_size": 1,
+        # latent 기준 tile 크기(64 = 512px)입니다. latent가 이보다 크면 tile로 나눠 decode합니다.
+        "tile_size": 64,
+        # latent 기준 tile끼리 겹치는 크기입니다. 겹친 영역은 선형으로 섞습니다.
+        "overlap": 8,
+    },
+    "attention": {
+        # xformers, sdpa, sliced, default 중 하나. auto라면 시작할 때 fallback 목록을
+        # 하나씩 측정해 가장 빠른 backend를 고릅니다.
+        "backend": "auto",
+        # backend를 적용할 수 없을 때(라이브러리가 없거나 LoRA와 함께 쓸 수 없을 때) 시도할 순서입니다.
+        "fallback": ["xformers", "sdpa", "sliced", "default"],
+        # auto일 때 측정에 사용할 이미지 개수, step 수, 반복 횟수입니다.
+        # 실제로 자주 들어오는 num_images_per_prompt에 맞추는 것이 좋습니다.
+        "benchmark_batch_size": 1,
+        "benchmark_steps": 5,
+        "benchmark_repeat": 2,
+    },
+    "compile": {
+        # torch.compile(torch>=2.0)로 UNet을 미리 컴파일합니다. 없다면 eager로 실행합니다.
+        "enabled": False,
+        # reduce-overhead는 CUDA graph로 kernel launch 오버헤드를 줄입니다.
+        "mode": "reduce-overhead",
+        # 컴파일해 둘 이미지 개수입니다. 요청은 가장 가까운 큰 bucket으로 패딩되고,
+        # 가장 큰 bucket보다 크거나 latent 크기가 다른 요청은 eager로 실행합니다.
+        "image_buckets": [1, 2, 4],
+        # runner가 시작할 때 모든 bucket을 미리 컴파일합니다.
+        "warmup": True,
+    },
+    "warmup": {
+        # runner가 시작할 때 worker마다 짧은 생성을 실행해 첫 요청의 지연을 없앱니다.
+        "enabled": True,
+        # warmup할 LoRA와 출력 이미지 크기(frontend에서 고를 수 있는 크기)입니다.
+        "adapters": ["openmoji", "notoemoji"],
+        "sizes": [512, 256, 128],
+        "num_inference_steps": 2,
+    },
+    "negative_prompt_cache": {
+        # negative prompt(없으면 빈 문자열)의 text encoder 출력을 저장해 재사용합니다.
+        "enabled": True,
+        "max_entries": 64,
+        # runner가 시작할 때 미리 계산해 둘 negative prompt입니다.
+        "preload": ["", "low quality"],
+    },
+    "result_store": {
+        # 생성한 이미지의 latent와 prompt embedding을 저장해 /eng_variation에서 다시 사용합니다.
+        # runner 프로세스 메모리에 저장되며, 이미지 한 장당 약 0.3MB(512px 기준)입니다.
+        "enabled": True,
+        "max_entries": 256,
+    },
+    "bulk": {
+        # /eng_bulk 요청 하나에 받을 최대 prompt 개수입니다.
+        "max_prompts": 32,
+        # 한 번의 pipeline 호출에 넣을 최대 prompt 개수입니다. policy.max_cost도 넘지 않도록 줄입니다.
+        "max_batch_size": 4,
+    },
+}
+
+CONFIG_PATH_ENV = "EMOJI_SERVING_CONFIG"
+ENV_PREFIX = "EMOJI_"
+
+
+def _merge(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """**override의 값을 base에 재귀적으로 덮어씁니다.**"""
+    merged = deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_serving_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """**서빙 설정을 읽어 기본값과 합친 dict를 리턴합니다.**
+    Args:
+        path (Optional[str]): 설정 파일 경로. 없으면 EMOJI_SERVING_CONFIG 또는
+        service.py 옆의 serving.yaml을 사용합니다.
+    Returns:
+        Dict[str, Any]: 기본값 < serving.yaml < 환경변수(EMOJI_<KEY>) 순으로 덮어쓴 설정.
+    """
+    path = path or os.getenv(
+        CONFIG_PATH_ENV, os.path.join(os.path.dirname(__file__), "serving.yaml")
+    )
+    config = deepcopy(DEFAULT_CONFIG)
+    if os.path.exists(path):
+        with open(path) as f:
+            config = _merge(config, yaml.safe_load(f) or {})
+    # 최상위 key는 환경변수로도 덮어쓸 수 있습니다.
+    # ex) EMOJI_STUB_PIPELINE=true, EMOJI_STAGE_TIMING='{response_header: true}'
+    for key in config:
+        env_value = os.getenv(ENV_PREFIX + key.upper())
+        if env_value is not None:
+            value = yaml.safe_load(env_value)
+            if isinstance(value, dict) and isinstance(config[key], dict):
+                value = _merge(config[key], value)
+            config[key] = value
+    return config
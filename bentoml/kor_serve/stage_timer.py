@@ -0,0 +1,106 @@
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Dict, Optional
+
+import bentoml
+
+# txt2img 안의 단계별 소요시간(초)을 기록하는 Prometheus histogram입니다.
+stage_histogram = bentoml.metrics.Histogram(
+    name="txt2img_stage_duration_seconds",
+    documentation="Time spent in each stage of StableDiffusionRunnable.txt2img",
+    labelnames=["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+
+STAGE_HEADER = "X-Stage-Timings"
+_NULL_STAGE = nullcontext()
+_local = threading.local()
+
+
+class StageTimer:
+    """**한 요청 안에서 단계별 소요시간을 측정합니다.**
+    enabled가 False라면 stage()는 미리 만들어 둔 nullcontext를 돌려주기만 하므로
+    측정을 끈 상태의 오버헤드는 거의 없습니다.
+    Args:
+        enabled (bool): 측정 여부.
+        synchronize (Optional[Callable]): 단계가 끝날 때 호출할 동기화 함수.
+        GPU 연산은 비동기로 실행되므로 torch.cuda.synchronize를 넘겨야 시간이 정확합니다.
+    """
+
+    def __init__(self, enabled: bool = True, synchronize: Optional[Callable] = None):
+        self.enabled = enabled
+        self.synchronize = synchronize
+        self.timings: Dict[str, float] = {}
+
+    def stage(self, name: str):
+        """**with 블록의 소요시간을 name 단계에 더합니다.**"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._measure(name)
+
+    @contextmanager
+    def _measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.synchronize is not None:
+                self.synchronize()
+            self.timings[name] = self.timings.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+    def split(self, total: str, rest: str, parts) -> None:
+        """**total 단계의 시간 중 parts에 속하지 않는 나머지를 rest 단계로 바꿉니다.**"""
+        if total not in self.timings:
+            return
+        remaining = self.timings.pop(total)
+        for part in parts:
+            remaining -= self.timings.get(part, 0.0)
+        self.timings[rest] = max(remaining, 0.0)
+
+    def __enter__(self) -> "StageTimer":
+        # pipeline 내부 단계(instrument_pipeline)가 현재 요청의 timer를 찾을 수 있도록 등록합니다.
+        _local.timer = self
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _local.timer = None
+        if self.enabled:
+            for name, seconds in self.timings.items():
+                stage_histogram.labels(stage=name).observe(seconds)
+
+    def to_header(self) -> str:
+        """**단계별 시간(ms)을 응답 헤더에 넣을 JSON 문자열로 바꿉니다.**"""
+        return json.dumps(
+            {name: round(seconds * 1000, 2) for name, seconds in self.timings.items()}
+        )
+
+
+def current_timer() -> Optional[StageTimer]:
+    """**현재 스레드에서 실행 중인 요청의 StageTimer를 리턴합니다.**"""
+    return getattr(_local, "timer", None)
+
+
+def _timed_method(method: Callable, stage: str) -> Callable:
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        timer = current_timer()
+        if timer is None:
+            return method(*args, **kwargs)
+        with timer.stage(stage):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+def instrument_pipeline(pipe) -> None:
+    """**pipeline의 text encoding, VAE decode 메서드를 감싸 단계별로 측정되게 합니다.**
+    pipeline 호출 전체 시간에서 두 단계를 뺀 나머지가 denoising 시간입니다.
+    """
+    for attr, stage in (("_encode_prompt", "text_encode"), ("decode_latents", "vae_decode")):
+        if hasattr(pipe, attr):
+            setattr(pipe, attr, _timed_method(getattr(pipe, attr), stage))
@@ -0,0 +1,114 @@
+from typing import Any, Dict, List
+
+import torch
+
+# AutoencoderKL config에 scaling_factor가 없던 버전의 기본값입니다.
+DEFAULT_SCALING_FACTOR = 0.18215
+# VAE decoder는 latent 한 칸을 8×8 픽셀로 키웁니다.
+VAE_UPSCALE = 8
+
+
+def _tile_starts(length: int, tile: int, overlap: int) -> List[int]:
+    """**length를 덮는 tile들의 시작 위치입니다. 마지막 tile은 끝에 맞춥니다.**"""
+    if length <= tile:
+        return [0]
+    stride = tile - overlap
+    starts = list(range(0, length - tile, stride))
+    return starts + [length - tile]
+
+
+def _blend_weight(
+    height: int, width: int, ramp: int, like: torch.Tensor
+) -> torch.Tensor:
+    """**가장자리 ramp 픽셀에서 선형으로 줄어드는 (1, 1, H, W) 가중치입니다.**
+    겹치는 영역에서 두 tile이 자연스럽게 섞이도록 합니다. 최소값이 0보다 크므로
+    이미지 테두리처럼 tile 하나만 덮는 영역도 가중치 합으로 나누면 원래 값이 됩니다.
+    """
+
+    def ramp_1d(length: int) -> torch.Tensor:
+        index = torch.arange(length, device=like.device, dtype=torch.float32)
+        edge = torch.minimum(index + 1, length - index) / (ramp + 1)
+        return edge.clamp(max=1.0)
+
+    return (ramp_1d(height)[:, None] * ramp_1d(width)[None, :])[None, None]
+
+
+@torch.no_grad()
+def tiled_decode(
+    vae, latents: torch.Tensor, batch_size: int, tile_size: int, overlap: int
+) -> torch.Tensor:
+    """**latent를 batch_size개씩, 공간적으로는 tile_size 크기의 tile로 나눠 decode합니다.**
+    한 번에 decoder를 통과하는 텐서가 작아지므로 이미지 개수와 해상도에 따른
+    최대 메모리 사용량이 줄어듭니다. tile 사이 overlap 영역은 선형 가중치로 섞습니다.
+    Args:
+        vae (AutoencoderKL): pipeline의 vae.
+        latents (torch.Tensor): scaling_factor로 나누기 전의 (B, 4, h, w) latent.
+        batch_size (int): decoder에 한 번에 넣을 latent 개수.
+        tile_size (int): latent 기준 tile 크기. latent가 이보다 작으면 tile로 나누지 않습니다.
+        overlap (int): latent 기준 tile끼리 겹치는 크기.
+    Returns:
+        torch.Tensor: [-1, 1] 범위의 (B, 3, 8h, 8w) 이미지 텐서.
+    """
+    scaling_factor = getattr(vae.config, "scaling_factor", DEFAULT_SCALING_FACTOR)
+    latents = latents / scaling_factor
+    _, _, height, width = latents.shape
+    outputs = []
+    for chunk in latents.split(batch_size):
+        if height <= tile_size and width <= tile_size:
+            outputs.append(vae.decode(chunk).sample)
+            continue
+        image = None
+        weight_sum = None
+        for top in _tile_starts(height, tile_size, overlap):
+            for left in _tile_starts(width, tile_size, overlap):
+                tile = chunk[:, :, top : top + tile_size, left : left + tile_size]
+                decoded = vae.decode(tile).sample
+                if image is None:
+                    # 겹친 영역을 더할 때 오차가 쌓이지 않도록 float32로 누적합니다.
+                    full_size = (height * VAE_UPSCALE, width * VAE_UPSCALE)
+                    image = decoded.new_zeros(
+                        (chunk.shape[0], decoded.shape[1], *full_size),
+                        dtype=torch.float32,
+                    )
+                    weight_sum = decoded.new_zeros(
+                        (1, 1, *full_size), dtype=torch.float32
+                    )
+                weight = _blend_weight(
+                    decoded.shape[2], decoded.shape[3], overlap * VAE_UPSCALE, decoded
+                )
+                y, x = top * VAE_UPSCALE, left * VAE_UPSCALE
+                rows = slice(y, y + decoded.shape[2])
+                cols = slice(x, x + decoded.shape[3])
+                image[:, :, rows, cols] += decoded.float() * weight
+                weight_sum[:, :, rows, cols] += weight
+        outputs.append((image / weight_sum).to(latents.dtype))
+    return torch.cat(outputs)
+
+
+def to_numpy_images(image: torch.Tensor):
+    """**[-1, 1] 범위의 decode 결과를 pipeline의 decode_latents와 같은 (B, H, W, 3) float numpy 배열로 바꿉니다.**"""
+    image = (image / 2 + 0.5).clamp(0, 1)
+    return image.cpu().permute(0, 2, 3, 1).float().numpy()
+
+
+def install_tiled_decode(pipe, config: Dict[str, Any]) -> None:
+    """**pipeline의 decode_latents를 tiled_decode를 사용하는 버전으로 바꿉니다.**
+    Args:
+        pipe (StableDiffusionPipeline): decode_latents를 바꿀 pipeline.
+        config (dict): serving.yaml의 vae_decode 설정.
+    """
+    if not config["enabled"]:
+        return
+
+    def decode_latents(latents: torch.Tensor):
+        image = tiled_decode(
+            pipe.vae,
+            latents,
+            config["batch_size"],
+            config["tile_size"],
+            config["overlap"],
+        )
+        # 기존 decode_latents와 같은 후처리입니다.
+        return to_numpy_images(image)
+
+    pipe.decode_latents = decode_latents
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# eng_serve의 모듈은 서로를 `from cost import ...`처럼 불러오므로 폴더를 path에 추가합니다.
+# (kor_serve는 같은 모듈을 그대로 복사해 사용합니다.)
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "eng_serve")
+)
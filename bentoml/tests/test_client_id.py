@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+from client_id import ANONYMOUS, client_id_from_headers, client_id_from_request
+
+
+class BentoRequestContext:
+    """**BentoML 1.0.13의 ctx.request처럼 headers와 metadata만 있는 요청입니다.**"""
+
+    def __init__(self, headers):
+        self.headers = headers
+        self.metadata = {}
+
+
+def test_bentoml_request_without_identifying_headers_is_anonymous():
+    ctx_request = BentoRequestContext({})
+    assert client_id_from_headers(ctx_request.headers) == ANONYMOUS
+
+
+def test_client_id_header_wins():
+    headers = {"X-Client-Id": "session-1", "X-Forwarded-For": "10.0.0.1"}
+    assert client_id_from_headers(headers) == "session-1"
+
+
+def test_forwarded_for_uses_first_address():
+    headers = {"X-Forwarded-For": "10.0.0.1, 10.0.0.2"}
+    assert client_id_from_headers(headers) == "10.0.0.1"
+
+
+def test_fastapi_request_without_headers_uses_client_address():
+    request = SimpleNamespace(headers={}, client=SimpleNamespace(host="10.0.0.3"))
+    assert client_id_from_request(request) == "10.0.0.3"
+
+
+def test_request_without_client_is_anonymous():
+    assert client_id_from_request(SimpleNamespace(headers={}, client=None)) == ANONYMOUS
+    assert client_id_from_request(BentoRequestContext({})) == ANONYMOUS
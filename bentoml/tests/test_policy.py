@@ -0,0 +1,191 @@
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from cost import estimate_cost
+from policy import PolicyViolation, RequestPolicy
+
+
+# service.py는 torch와 bentoml을 불러오므로 같은 필드의 모델을 여기서 정의합니다.
+class UserInput(BaseModel):
+    model: str = "openmoji"
+    prompt: str = "a cute bunny rabbit"
+    guidance_scale: Optional[float] = 15
+    size: Optional[int] = 512
+    num_inference_steps: Optional[int] = 30
+    num_images_per_prompt: Optional[int] = 1
+    seed: Optional[int] = None
+    negative_prompt: Optional[str] = None
+
+
+class VariationInput(BaseModel):
+    result_id: str
+    strength: Optional[float] = 0.5
+    num_inference_steps: Optional[int] = 30
+    num_images_per_prompt: Optional[int] = 1
+    size: Optional[int] = 512
+
+
+def make_policy(**overrides) -> RequestPolicy:
+    config = {
+        "mode": "clamp",
+        "allowed_models": ["openmoji", "notoemoji"],
+        "max_prompt_length": 300,
+        "min_size": 64,
+        "max_size": 1024,
+        "max_inference_steps": 50,
+        "max_images_per_prompt": 4,
+        "max_guidance_scale": 50,
+        "max_cost": 4.0,
+    }
+    config.update(overrides)
+    return RequestPolicy(config)
+
+
+def test_valid_input_is_returned_unchanged():
+    input_data = UserInput()
+    assert make_policy().apply(input_data) is input_data
+
+
+def test_clamp_mode_limits_out_of_range_values():
+    policy = make_policy()
+    result = policy.apply(
+        UserInput(
+            size=4096, num_inference_steps=500, guidance_scale=100, prompt="a" * 400
+        )
+    )
+    assert result.size == 1024
+    assert result.guidance_scale == 50
+    assert len(result.prompt) == 300
+    assert result.num_inference_steps <= 50
+
+
+def test_clamp_mode_fills_none_with_defaults():
+    result = make_policy().apply(UserInput(size=None, num_inference_steps=None))
+    assert result.size == 512
+    assert result.num_inference_steps == 30
+
+
+def test_clamp_mode_raises_lower_bounds():
+    result = make_policy().apply(UserInput(size=8, num_images_per_prompt=0))
+    assert result.size == 64
+    assert result.num_images_per_prompt == 1
+
+
+@pytest.mark.parametrize(
+    "overrides",
+    [
+        {"size": 4096},
+        {"num_inference_steps": 500},
+        {"num_images_per_prompt": 10},
+        {"guidance_scale": 100},
+        {"prompt": "a" * 400},
+        {"negative_prompt": "a" * 400},
+    ],
+)
+def test_reject_mode_raises_on_any_violation(overrides):
+    with pytest.raises(PolicyViolation):
+        make_policy(mode="reject").apply(UserInput(**overrides))
+
+
+def test_reject_mode_accepts_valid_input():
+    input_data = UserInput()
+    assert make_policy(mode="reject").apply(input_data) is input_data
+
+
+def test_cost_budget_reduces_images_first():
+    # 30 step × 4장 = 4.0, 한도 2.0이면 2장으로 줄입니다.
+    result = make_policy(max_cost=2.0).apply(UserInput(num_images_per_prompt=4))
+    assert result.num_images_per_prompt == 2
+    assert result.num_inference_steps == 30
+    assert (
+        estimate_cost(result.num_inference_steps, result.num_images_per_prompt) <= 2.0
+    )
+
+
+def test_cost_budget_reduces_steps_when_one_image_is_over_budget():
+    result = make_policy(max_cost=1.0).apply(
+        UserInput(num_inference_steps=50, num_images_per_prompt=4)
+    )
+    assert result.num_images_per_prompt == 1
+    assert result.num_inference_steps == 30
+    assert (
+        estimate_cost(result.num_inference_steps, result.num_images_per_prompt) <= 1.0
+    )
+
+
+def test_cost_budget_rejects_in_reject_mode():
+    with pytest.raises(PolicyViolation, match="budget"):
+        make_policy(mode="reject", max_cost=2.0).apply(
+            UserInput(num_images_per_prompt=4)
+        )
+
+
+@pytest.mark.parametrize("mode", ["clamp", "reject"])
+def test_disallowed_model_is_always_rejected(mode):
+    with pytest.raises(PolicyViolation, match="model"):
+        make_policy(mode=mode).apply(UserInput(model="../../etc"))
+
+
+def test_empty_allowed_models_allows_any_model():
+    input_data = UserInput(model="custom")
+    assert make_policy(allowed_models=[]).apply(input_data) is input_data
+
+
+@pytest.mark.parametrize("strength, expected", [(0.0, 0.01), (2.0, 1.0), (0.5, 0.5)])
+def test_apply_variation_clamps_strength(strength, expected):
+    result = make_policy().apply_variation(
+        VariationInput(result_id="r", strength=strength)
+    )
+    assert result.strength == expected
+
+
+def test_apply_variation_rejects_out_of_range_strength():
+    with pytest.raises(PolicyViolation, match="strength"):
+        make_policy(mode="reject").apply_variation(
+            VariationInput(result_id="r", strength=1.5)
+        )
+
+
+def test_apply_variation_budget_counts_only_strength_steps():
+    # strength 0.5라면 30 step × 4장의 비용은 2.0으로 한도 안입니다.
+    input_data = VariationInput(result_id="r", strength=0.5, num_images_per_prompt=4)
+    assert make_policy(max_cost=2.0).apply_variation(input_data) is input_data
+    result = make_policy(max_cost=1.0).apply_variation(input_data)
+    assert result.num_images_per_prompt == 2
+
+
+def test_apply_variation_clamps_steps_and_size():
+    result = make_policy().apply_variation(
+        VariationInput(result_id="r", num_inference_steps=0, size=2048)
+    )
+    assert result.num_inference_steps == 1
+    assert result.size == 1024
+
+
+def test_apply_variation_reduces_steps_when_one_image_is_over_budget():
+    # strength 1.0, 50 step 한 장의 비용은 50/30 ≈ 1.67로 한도 1.0을 넘습니다.
+    input_data = VariationInput(
+        result_id="r", strength=1.0, num_inference_steps=50, num_images_per_prompt=4
+    )
+    result = make_policy(max_cost=1.0).apply_variation(input_data)
+    assert result.num_images_per_prompt == 1
+    assert result.num_inference_steps == 30
+    assert (
+        estimate_cost(
+            result.num_inference_steps * result.strength, result.num_images_per_prompt
+        )
+        <= 1.0
+    )
+
+
+@pytest.mark.parametrize(
+    "steps, max_cost, expected",
+    [(30, 4.0, 4), (30, 2.0, 2), (60, 4.0, 2), (50, 1.0, 1)],
+)
+def test_max_images_for_respects_image_and_cost_limits(steps, max_cost, expected):
+    policy = make_policy(max_cost=max_cost)
+    assert policy.max_images_for(steps) == expected
+    if expected > 1:
+        assert estimate_cost(steps, expected) <= max_cost
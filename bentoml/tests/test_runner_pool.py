@@ -0,0 +1,154 @@
+from contextlib import ExitStack
+
+import pytest
+
+from runner_pool import NoHealthyWorker, RunnerPool, RunnerWorker, is_device_failure
+
+
+class RemoteError(Exception):
+    """**remote runner 호출이 실패했을 때의 오류를 흉내냅니다.**"""
+
+
+def make_pool(num_workers: int = 1, adapters=None) -> RunnerPool:
+    adapters = adapters or [None] * num_workers
+    return RunnerPool(
+        [
+            RunnerWorker(f"runner-{i}", runner=object(), active_adapter=adapter)
+            for i, adapter in enumerate(adapters[:num_workers])
+        ],
+        {"affinity_slack": 1.0, "max_failures": 2, "recovery_seconds": 60},
+        failure_types=(RemoteError,),
+    )
+
+
+def pick(pool: RunnerPool, adapter: str) -> str:
+    with pool.acquire(adapter, 1.0) as worker:
+        return worker.name
+
+
+def fail(pool: RunnerPool, error: Exception) -> None:
+    with pytest.raises(type(error)):
+        with pool.acquire("openmoji", 1.0):
+            raise error
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB"),
+        RuntimeError("CUDA error: device-side assert triggered"),
+        RuntimeError("cuDNN error: CUDNN_STATUS_INTERNAL_ERROR"),
+        MemoryError(),
+    ],
+)
+def test_device_errors_are_device_failures(error):
+    assert is_device_failure(error)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ValueError("bad size"),
+        IndexError("index 0 is out of bounds"),
+        KeyError("result_id"),
+        RuntimeError("The size of tensor a (64) must match the size of tensor b"),
+    ],
+)
+def test_input_errors_are_not_device_failures(error):
+    assert not is_device_failure(error)
+
+
+def test_input_errors_do_not_mark_worker_unhealthy():
+    pool = make_pool()
+    for _ in range(5):
+        fail(pool, ValueError("bad input"))
+    worker = pool.workers[0]
+    assert worker.healthy
+    assert worker.consecutive_failures == 0
+    assert worker.outstanding == 0
+
+
+def test_device_errors_mark_worker_unhealthy():
+    pool = make_pool()
+    for _ in range(2):
+        fail(pool, RuntimeError("CUDA out of memory"))
+    assert not pool.workers[0].healthy
+    with pytest.raises(NoHealthyWorker):
+        with pool.acquire("openmoji", 1.0):
+            pass
+
+
+def test_success_resets_consecutive_failures():
+    pool = make_pool()
+    fail(pool, RuntimeError("CUDA out of memory"))
+    with pool.acquire("openmoji", 1.0):
+        pass
+    fail(pool, RuntimeError("CUDA out of memory"))
+    assert pool.workers[0].healthy
+
+
+def test_remote_errors_in_failure_types_mark_worker_unhealthy():
+    pool = make_pool()
+    for _ in range(2):
+        fail(pool, RemoteError("An exception occurred in remote runner"))
+    assert not pool.workers[0].healthy
+
+
+def test_requests_go_to_least_loaded_worker():
+    pool = make_pool(3)
+    with ExitStack() as stack:
+        names = [
+            stack.enter_context(pool.acquire(adapter, cost)).name
+            for adapter, cost in (("openmoji", 2.0), ("notoemoji", 1.0))
+        ]
+        assert names == ["runner-0", "runner-1"]
+        assert [w.outstanding for w in pool.workers] == [2.0, 1.0, 0.0]
+        assert pick(pool, "custom") == "runner-2"
+    assert all(worker.outstanding == 0 for worker in pool.workers)
+
+
+def test_warm_worker_is_chosen_within_affinity_slack():
+    pool = make_pool(2, adapters=["notoemoji", "openmoji"])
+    with pool.acquire(None, 1.0, pool.workers[1]):
+        # openmoji가 적용된 runner-1이 affinity_slack(1.0)만큼만 더 바쁘므로 그대로 고릅니다.
+        assert pick(pool, "openmoji") == "runner-1"
+        with pool.acquire(None, 0.5, pool.workers[1]):
+            # slack을 넘게 바쁘면 남은 작업이 가장 적은 runner로 보냅니다.
+            assert pick(pool, "openmoji") == "runner-0"
+
+
+def test_dispatch_records_adapter_of_last_request():
+    pool = make_pool(2)
+    assert pick(pool, "notoemoji") == "runner-0"
+    assert pool.workers[0].active_adapter == "notoemoji"
+    # 둘 다 비어 있으므로 notoemoji가 마지막으로 보내진 runner-0으로 다시 보냅니다.
+    assert pick(pool, "notoemoji") == "runner-0"
+    assert pick(pool, "openmoji") == "runner-0"
+    assert pool.workers[0].active_adapter == "openmoji"
+
+
+def test_unhealthy_worker_is_skipped():
+    pool = make_pool(2)
+    for _ in range(2):
+        with pytest.raises(RemoteError):
+            with pool.acquire("openmoji", 1.0, pool.workers[0]):
+                raise RemoteError("connection refused")
+    assert [pick(pool, "openmoji") for _ in range(3)] == ["runner-1"] * 3
+
+
+def test_result_ids_route_back_to_the_runner_that_made_them():
+    pool = make_pool(3)
+    result = pool.tag_result_ids(pool.workers[2], {"result_ids": ["abc", "def"]})
+    assert result["result_ids"] == ["2-abc", "2-def"]
+    assert pool.route_result_id("2-def") == (pool.workers[2], "def")
+
+
+@pytest.mark.parametrize("result_id", ["abc", "7-abc", "x-abc", "1-"])
+def test_unknown_result_ids_have_no_runner(result_id):
+    pool = make_pool(2)
+    assert pool.route_result_id(result_id) == (None, result_id)
+
+
+def test_results_without_result_ids_are_unchanged():
+    pool = make_pool()
+    assert pool.tag_result_ids(pool.workers[0], {"images": []}) == {"images": []}
@@ -0,0 +1,154 @@
+import json
+import os
+from typing import Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 이미지 생성, 배경 제거를 요청할 BentoML 경로
+SUBMIT_PATH = os.environ.get("EMOJI_BACKEND_SUBMIT_PATH", "/eng_submit")
+STREAM_PATH = os.environ.get("EMOJI_BACKEND_STREAM_PATH", "/eng_stream")
+REMOVE_BACKGROUND_PATH = os.environ.get(
+    "EMOJI_BACKEND_REMOVE_BACKGROUND_PATH", "/eng_remove_background"
+)
+
+
+class BackendError(Exception):
+    """**모든 backend 주소에서 요청이 실패했을 때 발생합니다.**"""
+
+
+class BackendClient:
+    """**keep-alive 연결을 재사용하고, 실패하면 다음 backend로 넘어가는 HTTP client입니다.**
+    Streamlit은 버튼을 누를 때마다 스크립트를 다시 실행하므로, get_backend_client()로
+    프로세스에 하나만 만들어 연결(Session)을 재사용합니다.
+    연결 실패, 429(대기열 가득 참), 5xx는 다음 주소로 넘어가 다시 시도하지만,
+    응답 대기 시간 초과(read timeout)는 backend가 이미 생성중일 수 있으므로 다시 보내지 않습니다.
+    Args:
+        urls (List[str]): backend 주소 목록. ex) ["http://localhost:30001"]
+        connect_timeout (float): 연결 timeout(초).
+        read_timeout (float): 응답 timeout(초). 이미지 생성 시간보다 길어야 합니다.
+        pool_size (int): 주소마다 유지할 연결 수.
+        retries (int): 한 주소에서 연결 실패를 다시 시도할 횟수.
+    """
+
+    FAILOVER_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(
+        self,
+        urls: List[str],
+        connect_timeout: float = 3.0,
+        read_timeout: float = 120.0,
+        pool_size: int = 10,
+        retries: int = 1,
+    ):
+        self.urls = [url.rstrip("/") for url in urls]
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=len(self.urls),
+            pool_maxsize=pool_size,
+            # 요청이 서버에 닿기 전의 연결 실패만 다시 시도합니다.
+            max_retries=Retry(
+                total=retries, connect=retries, read=0, status=0, backoff_factor=0.2
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # 마지막으로 성공한 주소부터 시도합니다.
+        self._preferred = 0
+
+    @classmethod
+    def from_env(cls) -> "BackendClient":
+        """**환경변수로 설정한 BackendClient를 만듭니다.**
+        EMOJI_BACKEND_URLS: 쉼표로 구분한 backend 주소 (기본값 http://localhost:30001)
+        EMOJI_BACKEND_CONNECT_TIMEOUT, EMOJI_BACKEND_READ_TIMEOUT: timeout(초)
+        EMOJI_BACKEND_SUBMIT_PATH: 이미지 생성 경로 (기본값 /eng_submit)
+        EMOJI_BACKEND_STREAM_PATH: 이미지를 한 장씩 받는 생성 경로 (기본값 /eng_stream)
+        EMOJI_BACKEND_REMOVE_BACKGROUND_PATH: 배경 제거 경로 (기본값 /eng_remove_background)
+        """
+        urls = os.environ.get("EMOJI_BACKEND_URLS", "http://localhost:30001")
+        return cls(
+            [url.strip() for url in urls.split(",") if url.strip()],
+            connect_timeout=float(os.environ.get("EMOJI_BACKEND_CONNECT_TIMEOUT", 3)),
+            read_timeout=float(os.environ.get("EMOJI_BACKEND_READ_TIMEOUT", 120)),
+        )
+
+    def post(
+        self, path: str, client_id: Optional[str] = None, **kwargs
+    ) -> requests.Response:
+        """**path로 POST하고, 실패하면 다음 backend 주소로 넘어갑니다.**
+        Args:
+            path (str): 요청 경로. ex) /eng_submit
+            client_id (Optional[str]): X-Client-Id 헤더로 보낼 사용자 식별자.
+                backend는 이 값으로 사용자별 동시 요청 수(admission.max_per_client)를 제한합니다.
+            kwargs: requests.post의 인자. ex) json=data, stream=True
+        Returns:
+            requests.Response: 처음으로 성공한 응답.
+        Raises:
+            BackendError: 모든 주소가 실패했거나 backend가 요청을 거절(4xx)한 경우.
+        """
+        if client_id:
+            kwargs["headers"] = {**kwargs.get("headers", {}), "X-Client-Id": client_id}
+        errors = []
+        for offset in range(len(self.urls)):
+            index = (self._preferred + offset) % len(self.urls)
+            url = self.urls[index] + path
+            try:
+                response = self.session.post(url, timeout=self.timeout, **kwargs)
+            except requests.ConnectionError as e:
+                errors.append(f"{url}: {e.__class__.__name__}")
+                continue
+            except requests.Timeout as e:
+                raise BackendError(f"{url}: {e.__class__.__name__}") from e
+            if response.status_code in self.FAILOVER_STATUS:
+                errors.append(f"{url}: {response.status_code}")
+                response.close()
+                continue
+            if not response.ok:
+                raise BackendError(f"{url}: {response.status_code} {response.text}")
+            self._preferred = index
+            return response
+        raise BackendError("; ".join(errors))
+
+    def submit(self, data: Dict, client_id: Optional[str] = None) -> Dict:
+        """**이미지 생성 경로로 data를 보내고 응답 JSON(images, removes)을 리턴합니다.**"""
+        return self.post(SUBMIT_PATH, client_id, json=data).json()
+
+    def stream_submit(
+        self, data: Dict, client_id: Optional[str] = None
+    ) -> Iterator[Dict]:
+        """**이미지가 한 장씩 생성되는 대로 {"index", "image", ...} dict를 yield합니다.**
+        read timeout은 다음 이미지를 기다리는 시간에 적용됩니다.
+        Raises:
+            BackendError: 요청이 실패했거나, 응답을 읽는 도중 연결이 끊기거나 timeout된 경우.
+        """
+        response = self.post(STREAM_PATH, client_id, json=data, stream=True)
+        with response:
+            try:
+                for line in response.iter_lines():
+                    if line:
+                        yield json.loads(line)
+            except (requests.RequestException, ValueError) as e:
+                # 일부 이미지는 이미 받았을 수 있으므로 다시 보내지 않고 BackendError로 알립니다.
+                raise BackendError(f"{response.url}: {e.__class__.__name__}") from e
+
+    def remove_background(self, png: bytes, client_id: Optional[str] = None) -> bytes:
+        """**PNG 이미지 한 장을 보내 배경을 지운 PNG bytes를 받아옵니다.**"""
+        return self.post(
+            REMOVE_BACKGROUND_PATH,
+            client_id,
+            data=png,
+            headers={"Content-Type": "image/png"},
+        ).content
+
+
+_client: Optional[BackendClient] = None
+
+
+def get_backend_client() -> BackendClient:
+    """**프로세스에서 공유하는 BackendClient를 리턴합니다.**"""
+    global _client
+    if _client is None:
+        _client = BackendClient.from_env()
+    return _client
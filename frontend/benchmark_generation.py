@@ -0,0 +1,106 @@
+"""generation_image의 batch 생성과 기존의 한 장씩 생성(loop)을 비교합니다.
+
+같은 seed로 두 방식을 실행해 이미지 개수별 시간과 throughput(이미지/초), 두 결과의 최대 픽셀 차이를 출력합니다.
+    python benchmark_generation.py --num_images 1 2 4 --inference_step 30
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+import torch
+from diffusers import StableDiffusionPipeline
+
+from utils import generation_image
+
+
+def generation_image_loop(pipe, prompt, guidance_scale, inference_step, resize, seeds):
+    """**기존 generation_image처럼 seed마다 pipeline을 한 번씩 호출합니다.**"""
+    images = []
+    for seed in seeds:
+        generator = torch.Generator(pipe.device).manual_seed(seed)
+        image = pipe(
+            prompt=prompt,
+            guidance_scale=guidance_scale,
+            num_inference_steps=inference_step,
+            generator=generator,
+        ).images[0]
+        images.append(image.resize((resize, resize)))
+    return images
+
+
+def timed(fn, repeat: int):
+    """**fn을 repeat번 실행한 평균 시간(초)과 마지막 결과를 리턴합니다.**"""
+    elapsed = []
+    for _ in range(repeat):
+        torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        torch.cuda.synchronize()
+        elapsed.append(time.perf_counter() - start)
+    return sum(elapsed) / len(elapsed), result
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="batch 생성 throughput 벤치마크")
+    parser.add_argument("--pretrained_model", default="runwayml/stable-diffusion-v1-5")
+    parser.add_argument("--model_path", default="models/emoji-model-lora")
+    parser.add_argument("--prompt", default="a cute bunny rabbit")
+    parser.add_argument("--num_images", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--guidance_scale", type=float, default=10)
+    parser.add_argument("--inference_step", type=int, default=30)
+    parser.add_argument("--resize", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=2)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    pipe = StableDiffusionPipeline.from_pretrained(
+        args.pretrained_model, torch_dtype=torch.float16
+    )
+    pipe.unet.load_attn_procs(args.model_path)
+    pipe.to("cuda")
+    pipe.set_progress_bar_config(disable=True)
+    common = dict(
+        pipe=pipe,
+        prompt=args.prompt,
+        guidance_scale=args.guidance_scale,
+        inference_step=args.inference_step,
+        resize=args.resize,
+    )
+    # CUDA 초기화와 kernel 선택 시간이 첫 측정에 들어가지 않도록 한 번 실행해 둡니다.
+    generation_image(num_inference=1, seeds=[0], **common)
+
+    results = []
+    for num_images in args.num_images:
+        seeds = list(range(num_images))
+        loop_time, loop_images = timed(
+            lambda: generation_image_loop(seeds=seeds, **common), args.repeat
+        )
+        batch_time, batch_images = timed(
+            lambda: generation_image(num_inference=num_images, seeds=seeds, **common),
+            args.repeat,
+        )
+        # fp16 batch 연산의 순서 차이로 픽셀 값이 조금 다를 수 있습니다.
+        max_diff = max(
+            int(np.abs(np.asarray(a, np.int16) - np.asarray(b, np.int16)).max())
+            for a, b in zip(loop_images, batch_images)
+        )
+        results.append(
+            {
+                "num_images": num_images,
+                "loop_s": round(loop_time, 3),
+                "batch_s": round(batch_time, 3),
+                "loop_images_per_s": round(num_images / loop_time, 3),
+                "batch_images_per_s": round(num_images / batch_time, 3),
+                "speedup": round(loop_time / batch_time, 2),
+                "max_pixel_diff": max_diff,
+            }
+        )
+        print(json.dumps(results[-1]))
+
+
+if __name__ == "__main__":
+    main()
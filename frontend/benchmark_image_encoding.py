@@ -0,0 +1,89 @@
+"""생성된 이미지를 응답으로 보내기 위한 인코딩 방식들의 시간과 크기를 비교합니다.
+
+- loop: 기존 image_to_byte처럼 한 장씩 PNG + Base64
+- parallel: utils.image_to_byte (여러 장을 thread로 동시에 PNG + Base64)
+- raw: utils.image_to_raw (RGBA 배열 + header) 와 utils.raw_to_array로 되돌리는 시간
+GPU 없이 실행할 수 있도록 노이즈가 섞인 그라데이션 이미지를 사용합니다.
+    python benchmark_image_encoding.py --num_images 1 4 8 --size 512
+"""
+
+import argparse
+import base64
+import io
+import json
+import time
+
+import numpy as np
+from PIL import Image
+
+from utils import image_to_byte, image_to_raw, raw_to_array
+
+
+def make_images(num_images: int, size: int) -> list:
+    """**PNG 압축률이 실제 이모지와 비슷하도록 그라데이션에 약한 노이즈를 더한 이미지를 만듭니다.**"""
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(0, 255, size, dtype=np.float32)
+    base = np.stack(
+        np.broadcast_arrays(gradient[None, :], gradient[:, None], 128.0), -1
+    )
+    return [
+        Image.fromarray(
+            np.clip(base + rng.normal(0, 4, base.shape), 0, 255).astype(np.uint8)
+        )
+        for _ in range(num_images)
+    ]
+
+
+def image_to_byte_loop(image_list: list) -> list:
+    """**기존 image_to_byte와 같은 한 장씩 인코딩입니다.**"""
+    encoded = []
+    for image in image_list:
+        buffer = io.BytesIO()
+        image.save(buffer, format="png")
+        encoded.append(base64.b64encode(buffer.getvalue()).decode("ascii"))
+    return encoded
+
+
+def timed(fn, repeat: int):
+    """**fn을 repeat번 실행한 평균 시간(ms)과 마지막 결과를 리턴합니다.**"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="이미지 인코딩 벤치마크")
+    parser.add_argument("--num_images", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--size", type=int, default=512)
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    for num_images in args.num_images:
+        images = make_images(num_images, args.size)
+        loop_ms, loop_result = timed(lambda: image_to_byte_loop(images), args.repeat)
+        parallel_ms, parallel_result = timed(lambda: image_to_byte(images), args.repeat)
+        raw_ms, raw_payload = timed(lambda: image_to_raw(images), args.repeat)
+        decode_ms, _ = timed(lambda: raw_to_array(raw_payload), args.repeat)
+        assert parallel_result == loop_result
+        print(
+            json.dumps(
+                {
+                    "num_images": num_images,
+                    "size": args.size,
+                    "loop_ms": round(loop_ms, 2),
+                    "parallel_ms": round(parallel_ms, 2),
+                    "raw_ms": round(raw_ms, 2),
+                    "raw_decode_ms": round(decode_ms, 3),
+                    "base64_png_kib": round(sum(map(len, loop_result)) / 1024, 1),
+                    "raw_kib": round(len(raw_payload) / 1024, 1),
+                }
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
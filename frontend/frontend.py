@@ -1,15 +1,33 @@
 import streamlit as st
 import io
 import base64
-import requests
 import streamlit_nested_layout
 from streamlit_image_select import image_select
 
 from PIL import Image
-from rembg import remove
+from uuid import uuid4
+
+from backend_client import BackendError, get_backend_client
 
 st.set_page_config(page_title="Text-to-Emoji",layout="wide")
 
+# image_select에 보여줄 미리보기 이미지의 크기
+THUMBNAIL_SIZE = 128
+
+def make_thumbnails(png_list : list) -> list :
+    """**PNG bytes로 image_select에 넘길 미리보기 이미지를 한 번만 만듭니다.**
+    rerun마다 PNG를 다시 인코딩하지 않도록, 다운로드와 화면 표시는 PNG bytes를 그대로 사용하고
+    image_select에는 작은 미리보기 이미지를 넘깁니다.
+    Returns:
+        list: 미리보기 PIL Image 리스트
+    """
+    thumbnail_list = []
+    for png in png_list :
+        thumbnail = Image.open(io.BytesIO(png))
+        thumbnail.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        thumbnail_list.append(thumbnail)
+    return thumbnail_list
+
 def main():
     left, right = st.columns([4, 1])
 
@@ -33,6 +51,9 @@ def main():
         st.session_state['model_select'] = ""
     if "remove_bg" not in st.session_state :
         st.session_state['remove_bg'] = False
+    # backend가 사용자(session)별로 동시 요청 수를 제한할 수 있도록 X-Client-Id로 보냅니다.
+    if "client_id" not in st.session_state :
+        st.session_state['client_id'] = uuid4().hex
     
     with left :
         st.markdown("## Text-to-Emoji")
@@ -59,25 +80,42 @@ def main():
                 "guidance_scale":  st.session_state.guidance_scale,
                 "num_images_per_prompt":  st.session_state.num_inference,
                 "num_inference_steps":  st.session_state.inference_step,
-                "size":  st.session_state.output_size
+                "size":  st.session_state.output_size,
+                # 배경 제거는 사용자가 고른 이미지만 필요할 때 따로 요청합니다.
+                "remove_background": False,
                 }
             
             print(data)
             
             st.session_state.save_parameter = data
-            # 리퀘스트를 보낼 URL
-            response = requests.post("http://localhost:30001/eng_submit", json=data)
-
-            response = requests.post( "http://118.67.133.216:30001/eng_submit",json= data)
-
-            image_byte_list = response.json()["images"]
-            remove_image_byte_list = response.json()["removes"]
-
-            decode_image_list = [Image.open(io.BytesIO(base64.b64decode(image))) for image in image_byte_list ]
-            remove_decode_image_list = [Image.open(io.BytesIO(base64.b64decode(image))) for image in remove_image_byte_list ]
-           
-            st.session_state['image_list'] = decode_image_list
-            st.session_state['remove_bg_image_list'] = remove_decode_image_list
+            # 리퀘스트를 보낼 주소는 EMOJI_BACKEND_URLS 환경변수로 설정합니다.
+            # 이미지가 한 장씩 도착하는 대로 화면에 먼저 보여줍니다.
+            progress = st.empty()
+            png_list = [None] * st.session_state.num_inference
+            try:
+                for event in get_backend_client().stream_submit(data, st.session_state.client_id):
+                    if "error" in event :
+                        st.error(f"이미지 생성에 실패했습니다. ({event['error']})")
+                        continue
+                    png_list[event["index"]] = base64.b64decode(event["image"])
+                    with progress.container():
+                        for col, png in zip(st.columns(len(png_list)), png_list):
+                            if png is not None :
+                                col.image(png, use_column_width="auto")
+            except BackendError as e:
+                st.error(f"이미지 생성에 실패했습니다. ({e})")
+            progress.empty()
+
+            png_list = [png for png in png_list if png is not None]
+            if not png_list :
+                st.session_state.submit = False
+                st.stop()
+            thumbnail_list = make_thumbnails(png_list)
+
+            st.session_state['image_list'] = png_list
+            st.session_state['thumbnail_list'] = thumbnail_list
+            # 배경을 지운 이미지는 처음 볼 때 받아와서 저장합니다.
+            st.session_state['remove_bg_image_list'] = [None] * len(png_list)
             
             st.session_state.submit = False
             st.session_state['remove_bg'] = False
@@ -87,7 +125,7 @@ def main():
             st.markdown("#### Show Generation Image")
             img_index = image_select(
                 label="",
-                images= st.session_state['image_list'],
+                images= st.session_state['thumbnail_list'],
                 use_container_width = 10,
                 return_value = "index" 
             )
@@ -113,18 +151,19 @@ def main():
                             }
                         </style>
                         """, unsafe_allow_html=True)
+                    # 저장해 둔 PNG bytes를 그대로 보여주고 다운로드하므로 rerun마다 인코딩하지 않습니다.
+                    buf_img = st.session_state['image_list'][img_index]
                     if st.session_state["remove_bg"] :
-                        st.image(st.session_state['remove_bg_image_list'][img_index], use_column_width="auto")
-                        img = st.session_state['remove_bg_image_list'][img_index]
-                    else :
-                        st.image(st.session_state['image_list'][img_index], use_column_width="auto")
-                        img = st.session_state['image_list'][img_index]
+                        if st.session_state['remove_bg_image_list'][img_index] is None :
+                            try:
+                                with st.spinner("Removing background...") :
+                                    st.session_state['remove_bg_image_list'][img_index] = get_backend_client().remove_background(buf_img, st.session_state.client_id)
+                            except BackendError as e:
+                                st.error(f"배경 제거에 실패했습니다. ({e})")
+                        buf_img = st.session_state['remove_bg_image_list'][img_index] or buf_img
+                    st.image(buf_img, use_column_width="auto")
     
                 with image_col2 :
-                    buf = io.BytesIO()
-                    img.save(buf, format = "PNG")
-                    buf_img = buf.getvalue()
-
                     btn = st.download_button(
                         label="Download image",
                         data= buf_img,
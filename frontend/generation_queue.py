@@ -0,0 +1,44 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+
+class QueueFull(Exception):
+    """**대기중인 생성 요청이 max_pending개를 넘어 새 요청을 받을 수 없을 때 발생합니다.**"""
+
+
+class GenerationQueue:
+    """**이미지 생성처럼 오래 걸리는 blocking 함수를 전용 thread에서 실행하는 크기 제한 대기열입니다.**
+    event loop를 막지 않으므로 생성중에도 다른 요청(`/` 등)에 바로 응답할 수 있습니다.
+    Args:
+        workers (int): 생성을 실행할 thread 수. GPU 하나라면 1이 적당합니다.
+        max_pending (int): 실행중인 요청을 포함해 받을 수 있는 최대 요청 수.
+    """
+
+    def __init__(self, workers: int = 1, max_pending: int = 8):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="generation"
+        )
+        self.max_pending = max_pending
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """**fn(*args, **kwargs)를 생성 thread에서 실행하고 결과를 기다립니다.**
+        Raises:
+            QueueFull: 이미 max_pending개의 요청이 대기중인 경우.
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise QueueFull(f"{self.pending} requests are already pending")
+            self.pending += 1
+        future = self.executor.submit(partial(fn, *args, **kwargs))
+        # 클라이언트가 끊겨도 실행중인 생성은 멈추지 않으므로, 실제로 끝났을 때 자리를 돌려줍니다.
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
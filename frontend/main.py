@@ -1,25 +1,45 @@
-import torch
+import asyncio
+import base64
+import os
 
 from fastapi import FastAPI, Body
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 
 from uuid import UUID, uuid4
 from pydantic import BaseModel, Field
 
 from typing import List, Union , Dict, Any, Optional
 from fastapi.param_functions import Depends
-from app.utils import generation_image, image_to_byte
+from app.utils import generation_image, image_to_byte, image_to_raw
+from app.generation_queue import GenerationQueue, QueueFull
+from app.model_manager import ModelManager
+from app.order_store import OrderStore
 from datetime import datetime
-from diffusers import StableDiffusionPipeline
 
 app = FastAPI()
-pretrained_model = 'runwayml/stable-diffusion-v1-5'
-model_path = "models/emoji-model-lora"
+# base 모델과 LoRA 경로는 MODEL_PRETRAINED, MODEL_ADAPTER_PATH 환경변수로 바꿀 수 있습니다.
+# 모델은 첫 /submit 요청에서 불러오며, MODEL_PRELOAD=true라면 서버가 시작할 때 불러옵니다.
+model_manager = ModelManager.from_env()
 
-pipe = StableDiffusionPipeline.from_pretrained(pretrained_model, torch_dtype=torch.float16)
-pipe.unet.load_attn_procs(model_path)
+# 생성한 주문은 ORDER_STORE_DIR에 ORDER_TTL_SECONDS 동안 저장해 GET /orders/{id}로 다시 받을 수 있습니다.
+order_store = OrderStore.from_env()
 
-pipe.to("cuda")
+# 생성은 전용 thread에서 실행하고, 대기중인 요청이 너무 많으면 429를 돌려줍니다.
+generation_queue = GenerationQueue(
+    workers=int(os.environ.get("GENERATION_WORKERS", 1)),
+    max_pending=int(os.environ.get("GENERATION_MAX_PENDING", 8)),
+)
+
+@app.on_event("startup")
+async def preload_model() :
+    if os.environ.get("MODEL_PRELOAD", "false").lower() == "true" :
+        # 생성 thread에서 불러오므로 그동안에도 `/`에는 바로 응답합니다.
+        asyncio.ensure_future(generation_queue.run(model_manager.get))
+
+@app.on_event("startup")
+async def evict_orders() :
+    # 서버가 꺼져 있는 동안 만료된 주문을 정리합니다.
+    asyncio.get_running_loop().run_in_executor(None, order_store.evict_expired)
 
 @app.get("/")
 def hello_world() :
@@ -47,26 +67,43 @@ class InferenceImageProduct(Product) :
     image_list : list
 
 @app.post("/submit")
-async def make_image(data: Product = Body(...)) :
+async def make_image(data: Product = Body(...), format : str = "png") :
     # Depends : 의존성 주입
     # 반복적이고 공통적인 로직이 중요할 때 사용 할 수 있음
     # 모델을 Load, Config Load
     # async , Depends 검색해서 또 학습해보기!
+    # generation_image는 GPU 연산이 끝날 때까지 blocking이므로 event loop가 아닌 생성 thread에서 실행합니다.
+    # format=raw라면 PNG/Base64 대신 image_to_raw의 binary를 돌려줍니다. (서비스 사이의 호출용, utils.raw_to_array로 읽기)
+    try :
+        if format == "raw" :
+            content = await generation_queue.run(generate_raw, data)
+            return Response(content=content, media_type="application/octet-stream", headers={"X-Product-Id" : str(data.id)})
+        return await generation_queue.run(generate_order, data)
+    except QueueFull as e :
+        return JSONResponse({"error" : str(e)}, status_code=429)
+
+def generate_images(data: Product) -> List :
+    return generation_image(
+        pipe= model_manager.get(),
+        prompt=data.prompt,
+        guidance_scale = data.guidance_scale,
+        num_inference = data.num_inference,
+        inference_step = data.inference_step,
+        resize= data.resize,
+        )
+
+def generate_raw(data: Product) -> bytes :
+    return image_to_raw(generate_images(data))
+
+# 생성 thread에서 실행되는 이미지 생성과 인코딩
+def generate_order(data: Product) -> Order :
     prompt = data.dict()['prompt']
     guidance_scale = data.dict()['guidance_scale']
     num_inference = data.dict()['num_inference']
     inference_step = data.dict()['inference_step']
     resize = data.dict()['resize']
 
-    # TODO: pipe load와 inference를 분리해서 함수로 만들기
-    image_list = generation_image(
-        pipe= pipe,
-        prompt=prompt,
-        guidance_scale = guidance_scale,
-        num_inference = num_inference,
-        inference_step = inference_step,
-        resize= resize,
-        )
+    image_list = generate_images(data)
 
     decode_image_list = image_to_byte(image_list)
     image_proudct = InferenceImageProduct(
@@ -79,5 +116,25 @@ async def make_image(data: Product = Body(...)) :
         )
 
     new_order = Order(products = image_proudct)
+    order_store.save(
+        str(new_order.id),
+        image_proudct.dict(exclude={"image_list"}),
+        [base64.b64decode(image) for image in decode_image_list],
+        new_order.created_at.timestamp(),
+        )
     return new_order
 
+# 저장된 주문은 GPU 대신 디스크에서 읽어 돌려줍니다.
+@app.get("/orders/{order_id}")
+def get_order(order_id: UUID) :
+    stored = order_store.load(str(order_id))
+    if stored is None :
+        return JSONResponse({"error" : f"order {order_id} is not stored"}, status_code=404)
+    metadata, images, created_at = stored
+    image_product = InferenceImageProduct(
+        **metadata,
+        image_list = [base64.b64encode(png).decode('ascii') for png in images],
+        )
+    created_at = datetime.fromtimestamp(created_at)
+    return Order(id = order_id, products = image_product, created_at = created_at, updated_at = created_at)
+
@@ -0,0 +1,57 @@
+import os
+import threading
+
+
+class ModelManager:
+    """**txt2img pipeline을 처음 사용할 때 한 번만 불러와 공유합니다.**
+    main.py를 import할 때 모델을 불러오지 않으므로 서버 시작과 uvicorn reload가 빨라집니다.
+    Args:
+        pretrained_model (str): base 모델 이름 또는 경로.
+        adapter_path (str): 적용할 LoRA(attention processor) 경로. 빈 문자열이면 적용하지 않습니다.
+        device (str): pipeline을 올릴 device.
+    """
+
+    def __init__(self, pretrained_model: str, adapter_path: str, device: str = "cuda"):
+        self.pretrained_model = pretrained_model
+        self.adapter_path = adapter_path
+        self.device = device
+        self._pipe = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "ModelManager":
+        """**환경변수로 설정한 ModelManager를 만듭니다.**
+        MODEL_PRETRAINED: base 모델 (기본값 runwayml/stable-diffusion-v1-5)
+        MODEL_ADAPTER_PATH: LoRA 경로 (기본값 models/emoji-model-lora)
+        MODEL_DEVICE: device (기본값 cuda)
+        """
+        return cls(
+            os.environ.get("MODEL_PRETRAINED", "runwayml/stable-diffusion-v1-5"),
+            os.environ.get("MODEL_ADAPTER_PATH", "models/emoji-model-lora"),
+            os.environ.get("MODEL_DEVICE", "cuda"),
+        )
+
+    @property
+    def loaded(self) -> bool:
+        return self._pipe is not None
+
+    def get(self):
+        """**pipeline을 리턴합니다. 아직 불러오지 않았다면 불러옵니다.**"""
+        if self._pipe is None:
+            with self._lock:
+                # 여러 요청이 동시에 들어와도 한 번만 불러옵니다.
+                if self._pipe is None:
+                    self._pipe = self._load()
+        return self._pipe
+
+    def _load(self):
+        import torch
+        from diffusers import StableDiffusionPipeline
+
+        print(f"{self.pretrained_model}({self.adapter_path})를 불러옵니다.")
+        pipe = StableDiffusionPipeline.from_pretrained(
+            self.pretrained_model, torch_dtype=torch.float16
+        )
+        if self.adapter_path:
+            pipe.unet.load_attn_procs(self.adapter_path)
+        return pipe.to(self.device)
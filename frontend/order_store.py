@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class OrderStore:
+    """**생성 결과(Order)를 디스크에 저장해, 다시 받을 때 GPU 대신 디스크에서 읽도록 합니다.**
+    메타데이터는 SQLite(root/orders.db)에, 이미지는 PNG bytes의 sha256을 이름으로 하는 파일
+    (root/images/ab/abcd....png)에 저장하므로 같은 이미지는 한 번만 저장됩니다.
+    ttl_seconds가 지난 주문은 evict_expired에서 지우고, 더 이상 참조되지 않는 이미지 파일도 함께 지웁니다.
+    Args:
+        root (str): 저장할 디렉토리.
+        ttl_seconds (float): 주문을 보관할 시간(초).
+        evict_interval (float): save에서 만료된 주문을 정리하는 최소 간격(초).
+    """
+
+    def __init__(self, root: str, ttl_seconds: float, evict_interval: float = 60):
+        self.root = root
+        self.image_dir = os.path.join(root, "images")
+        self.ttl_seconds = ttl_seconds
+        self.evict_interval = evict_interval
+        self._last_evict = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(self.image_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS orders ("
+                "id TEXT PRIMARY KEY, metadata TEXT NOT NULL, images TEXT NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS orders_expires_at ON orders (expires_at)"
+            )
+
+    @classmethod
+    def from_env(cls) -> "OrderStore":
+        """**ORDER_STORE_DIR(기본값 orders), ORDER_TTL_SECONDS(기본값 86400)로 OrderStore를 만듭니다.**"""
+        return cls(
+            os.environ.get("ORDER_STORE_DIR", "orders"),
+            float(os.environ.get("ORDER_TTL_SECONDS", 24 * 60 * 60)),
+        )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # 요청마다 다른 thread에서 호출되므로 호출할 때마다 연결하고, 끝나면 commit 후 닫습니다.
+        conn = sqlite3.connect(os.path.join(self.root, "orders.db"), timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _image_path(self, digest: str) -> str:
+        return os.path.join(self.image_dir, digest[:2], digest + ".png")
+
+    def _write_image(self, png: bytes) -> str:
+        digest = hashlib.sha256(png).hexdigest()
+        path = self._image_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 다른 요청이 같은 파일을 읽는 중일 수 있으므로 임시 파일에 쓴 뒤 바꿉니다.
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+        return digest
+
+    def save(
+        self,
+        order_id: str,
+        metadata: Dict,
+        images: List[bytes],
+        created_at: Optional[float] = None,
+    ) -> None:
+        """**주문의 메타데이터와 PNG 이미지들을 저장합니다.**
+        Args:
+            order_id (str): 주문 id.
+            metadata (Dict): JSON으로 저장할 생성 설정. (prompt, guidance_scale 등)
+            images (List[bytes]): PNG bytes 리스트.
+            created_at (Optional[float]): 주문 시각(timestamp). 없으면 현재 시각.
+        """
+        created_at = time.time() if created_at is None else created_at
+        # evict_expired가 아직 참조되지 않은 새 이미지 파일을 지우지 않도록 lock 안에서 씁니다.
+        with self._lock, self._connect() as conn:
+            digests = [self._write_image(png) for png in images]
+            conn.execute(
+                "INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?)",
+                (
+                    order_id,
+                    json.dumps(metadata, default=str),
+                    json.dumps(digests),
+                    created_at,
+                    created_at + self.ttl_seconds,
+                ),
+            )
+        if time.time() - self._last_evict > self.evict_interval:
+            self.evict_expired()
+
+    def load(self, order_id: str) -> Optional[Tuple[Dict, List[bytes], float]]:
+        """**저장된 주문을 (메타데이터, PNG bytes 리스트, 주문 시각)으로 리턴합니다.**
+        없거나 만료되었거나 이미지 파일이 지워졌다면 None을 리턴합니다.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT metadata, images, created_at FROM orders "
+                "WHERE id = ? AND expires_at > ?",
+                (order_id, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        metadata, digests, created_at = row
+        images = []
+        for digest in json.loads(digests):
+            try:
+                with open(self._image_path(digest), "rb") as f:
+                    images.append(f.read())
+            except FileNotFoundError:
+                return None
+        return json.loads(metadata), images, created_at
+
+    def evict_expired(self) -> int:
+        """**만료된 주문과, 남은 주문이 참조하지 않는 이미지 파일을 지우고 지운 주문 수를 리턴합니다.**"""
+        with self._lock:
+            self._last_evict = time.time()
+            with self._connect() as conn:
+                removed = conn.execute(
+                    "DELETE FROM orders WHERE expires_at <= ?", (self._last_evict,)
+                ).rowcount
+                if not removed:
+                    return 0
+                referenced = set()
+                for (digests,) in conn.execute("SELECT images FROM orders"):
+                    referenced.update(json.loads(digests))
+            for directory, _, files in os.walk(self.image_dir):
+                for name in files:
+                    if name.endswith(".png") and name[:-4] not in referenced:
+                        os.remove(os.path.join(directory, name))
+        return removed
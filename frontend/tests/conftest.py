@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# frontend의 모듈은 `from utils import ...`처럼 불러옵니다.
+sys.path.insert(0, os.path.join(ROOT, "frontend"))
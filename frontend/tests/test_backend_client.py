@@ -0,0 +1,40 @@
+import pytest
+import requests
+
+from backend_client import BackendClient, BackendError
+
+
+class BrokenStream:
+    """**첫 줄을 보낸 뒤 연결이 끊기는 streaming 응답입니다.**"""
+
+    url = "http://backend/eng_stream"
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_lines(self):
+        yield b'{"index": 0, "image": ""}'
+        raise self.error
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        requests.exceptions.ChunkedEncodingError("connection reset"),
+        requests.exceptions.ConnectionError("read timed out"),
+    ],
+)
+def test_stream_submit_raises_backend_error_while_reading(monkeypatch, error):
+    client = BackendClient(["http://backend"])
+    monkeypatch.setattr(client, "post", lambda *args, **kwargs: BrokenStream(error))
+    events = []
+    with pytest.raises(BackendError):
+        for event in client.stream_submit({"prompt": "a cute bunny rabbit"}):
+            events.append(event)
+    assert events == [{"index": 0, "image": ""}]
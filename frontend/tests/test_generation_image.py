@@ -0,0 +1,95 @@
+import pytest
+from PIL import Image
+
+import utils
+from utils import generation_image
+
+
+class FakeGenerator:
+    """**torch.Generator 대신 사용하는, seed만 기억하는 generator입니다.**"""
+
+    def __init__(self, device, seed: int):
+        self.device = device
+        self.seed = seed
+
+    def initial_seed(self) -> int:
+        return self.seed
+
+
+class FakePipeline:
+    """**호출마다 받은 인자(generator, num_images_per_prompt)를 기록하는 pipeline입니다.**"""
+
+    device = "cpu"
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, prompt, num_images_per_prompt=1, generator=None, **kwargs):
+        self.calls.append(
+            {"num_images_per_prompt": num_images_per_prompt, "generator": generator}
+        )
+        images = [Image.new("RGB", (64, 64)) for _ in range(num_images_per_prompt)]
+        return type("Output", (), {"images": images})
+
+
+@pytest.fixture(autouse=True)
+def fake_generators(monkeypatch):
+    monkeypatch.setattr(
+        utils,
+        "seed_generators",
+        lambda device, seeds: [FakeGenerator(device, seed) for seed in seeds],
+    )
+
+
+def generate(pipe, seeds, num_inference=None, resize=64):
+    return generation_image(
+        pipe=pipe,
+        prompt="a cute bunny rabbit",
+        guidance_scale=10,
+        num_inference=num_inference or len(seeds or []),
+        inference_step=30,
+        resize=resize,
+        seeds=seeds,
+    )
+
+
+def received_seeds(call):
+    return [generator.initial_seed() for generator in call["generator"]]
+
+
+def test_batch_passes_one_generator_per_seed_in_order():
+    pipe = FakePipeline()
+    generate(pipe, [5, 6, 7])
+    (call,) = pipe.calls
+    assert call["num_images_per_prompt"] == 3
+    assert received_seeds(call) == [5, 6, 7]
+    assert all(generator.device == pipe.device for generator in call["generator"])
+
+
+def test_batch_matches_per_seed_calls():
+    # 한 번의 batch 호출과 seed마다 한 장씩 호출할 때 pipeline이 받는 seed가 같은 순서로 같아야 합니다.
+    batch, single = FakePipeline(), FakePipeline()
+    generate(batch, [5, 6, 7])
+    for seed in [5, 6, 7]:
+        generate(single, [seed])
+    assert [call["num_images_per_prompt"] for call in single.calls] == [1, 1, 1]
+    assert received_seeds(batch.calls[0]) == [
+        seed for call in single.calls for seed in received_seeds(call)
+    ]
+
+
+def test_random_seeds_are_drawn_per_image():
+    pipe = FakePipeline()
+    images = generate(pipe, None, num_inference=3, resize=32)
+    (call,) = pipe.calls
+    assert call["num_images_per_prompt"] == 3
+    assert len(received_seeds(call)) == 3
+    assert len(images) == 3
+    assert all(image.size == (32, 32) for image in images)
+
+
+def test_seed_generators_are_seeded_torch_generators(monkeypatch):
+    pytest.importorskip("torch")
+    monkeypatch.undo()
+    generators = utils.seed_generators("cpu", [1, 2, 3])
+    assert [generator.initial_seed() for generator in generators] == [1, 2, 3]
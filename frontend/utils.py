@@ -1,36 +1,84 @@
-from diffusers import StableDiffusionPipeline
 from PIL import Image
-from typing import List , Dict
-import torch
+from typing import List , Dict, Optional
 import random
 import io
+import os
 import base64
+import struct
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+def seed_generators(device, seeds : List[int]) -> List :
+    """**seed마다 manual_seed한 torch.Generator 리스트를 만듭니다.**"""
+    # torch는 생성할 때만 필요하므로 여기서 불러옵니다. (인코딩 함수와 벤치마크는 torch 없이 사용할 수 있습니다.)
+    import torch
+
+    return [torch.Generator(device).manual_seed(seed) for seed in seeds]
 
 def generation_image(pipe,
                 prompt : str,
                 guidance_scale : int,
                 num_inference : int,
                 inference_step : int,
-                resize : int 
+                resize : int,
+                seeds : Optional[List[int]] = None,
                 ) -> List :
+    """**num_inference장의 이미지를 한 번의 batch pipeline 호출로 생성합니다.**
+    이미지마다 seed를 가진 generator를 넘기므로, 같은 seed라면 한 장씩 생성했을 때와 같은 초기 latent에서 시작합니다.
+    Args:
+        seeds (Optional[List[int]]): 이미지별 seed. 없으면 이미지마다 0~1024의 임의의 seed를 사용합니다.
+    Returns:
+        List: resize된 PIL Image 리스트
+    """
+    if seeds is None :
+        seeds = [random.randint(0,1024) for _ in range(num_inference)]
+    generator = seed_generators(pipe.device, seeds)
+    images = pipe(
+        prompt=prompt,
+        guidance_scale=guidance_scale,
+        num_inference_steps= inference_step,
+        num_images_per_prompt=len(seeds),
+        generator=generator,
+        ).images
+    return [image.resize((resize,resize)) for image in images]
+
+# PNG 인코딩(zlib)은 GIL을 놓고 실행되므로 thread로 여러 장을 동시에 인코딩할 수 있습니다.
+_encode_executor = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1), thread_name_prefix="png")
 
-    output_image = []
-    for i in range(num_inference):
-        generator = torch.Generator("cuda").manual_seed(random.randint(0,1024))
-        image = pipe(prompt=prompt, guidance_scale=guidance_scale, num_inference_steps= inference_step, generator=generator).images[0]
-        image = image.resize((resize,resize))
-        output_image.append(image)
-    return output_image
+def _png_base64(image) -> str :
+    imgByteArr = io.BytesIO()
+    image.save(imgByteArr, format = 'png')
+    return base64.b64encode(imgByteArr.getvalue()).decode('ascii')
 
 def image_to_byte(image_list : List ) -> List :
-    
-    decode_image_list = []
-    for idx , image in enumerate(image_list):
-        imgByteArr = io.BytesIO()
-        image.save(imgByteArr, format = 'png')
-        imgByteArr = imgByteArr.getvalue()
-        encoded_img = base64.b64encode(imgByteArr)
-        decoded_img = encoded_img.decode('ascii')
-        decode_image_list.append(decoded_img)
-    
-    return decode_image_list
+    """**이미지들을 PNG로 인코딩한 뒤 Base64 문자열 리스트로 리턴합니다. (여러 장을 동시에 인코딩)**"""
+    if len(image_list) <= 1 :
+        return [_png_base64(image) for image in image_list]
+    return list(_encode_executor.map(_png_base64, image_list))
+
+# raw 포맷의 header: magic, 이미지 개수, height, width, channel (little endian)
+RAW_HEADER = struct.Struct("<4sIIII")
+RAW_MAGIC = b"EMJR"
+
+def image_to_raw(image_list : List ) -> bytes :
+    """**같은 크기의 이미지들을 uint8 RGBA 배열 하나로 묶어 header와 함께 binary로 리턴합니다.**
+    PNG/Base64 인코딩 없이 서비스 사이에서 이미지를 주고받을 때 사용합니다. raw_to_array로 되돌립니다.
+    Returns:
+        bytes: RAW_HEADER + (개수, height, width, 4) uint8 배열
+    """
+    array = np.stack([np.asarray(image.convert("RGBA")) for image in image_list])
+    count, height, width, channel = array.shape
+    return RAW_HEADER.pack(RAW_MAGIC, count, height, width, channel) + array.tobytes()
+
+def raw_to_array(payload : bytes) -> np.ndarray :
+    """**image_to_raw의 결과를 복사 없이 (개수, height, width, 4) uint8 배열로 읽습니다.**
+    Raises:
+        ValueError: header가 올바르지 않거나 길이가 맞지 않는 경우
+    """
+    magic, count, height, width, channel = RAW_HEADER.unpack_from(payload)
+    if magic != RAW_MAGIC :
+        raise ValueError("not an image_to_raw payload")
+    if len(payload) != RAW_HEADER.size + count * height * width * channel :
+        raise ValueError("payload length does not match the header")
+    array = np.frombuffer(payload, dtype=np.uint8, offset=RAW_HEADER.size)
+    return array.reshape(count, height, width, channel)
@@ -47,6 +47,7 @@ from diffusers import (
 )
 from diffusers.loaders import AttnProcsLayers
 from diffusers.models.cross_attention import LoRACrossAttnProcessor
+from diffusers.models.vae import DiagonalGaussianDistribution
 from diffusers.optimization import get_scheduler
 from diffusers.utils import check_min_version, is_wandb_available
 from diffusers.utils.import_utils import is_xformers_available
@@ -58,6 +59,7 @@ from omegaconf import OmegaConf
 from examples.AltCLIP.hf_altclip.modeling_altclip import AltCLIP
 from examples.AltCLIP.hf_altclip.processing_altclip import AltCLIPProcessor
 from examples.AltCLIP.hf_altclip.configuration_altclip import AltCLIPConfig
+from utils.latent_cache import LatentCache, make_variant_transform
 # from pororo import Pororo
 
 # Will error if the minimal version of diffusers is not installed. Remove at your own risks.
@@ -387,6 +389,31 @@ def parse_args():
         action="store_true",
         help="Whether or not to use xformers.",
     )
+    parser.add_argument(
+        "--latent_cache_dir",
+        type=str,
+        default=None,
+        help=(
+            "If set, encode every training image with the VAE once and store the latent distributions in this"
+            " directory. Training then samples latents from the cache and the VAE is not moved to the GPU. The"
+            " cache is reused while the model, dataset and image transform arguments stay the same."
+        ),
+    )
+    parser.add_argument(
+        "--latent_cache_crops",
+        type=int,
+        default=1,
+        help=(
+            "Number of random crops to cache per image when `--center_crop` is not set. With `--random_flip`,"
+            " the flipped version of every crop is cached as well."
+        ),
+    )
+    parser.add_argument(
+        "--latent_cache_device",
+        type=str,
+        default="cpu",
+        help="Device used to build the latent cache. Use `cuda` to build it faster on the GPU.",
+    )
 
     args = parser.parse_args()
     # config.yaml load
@@ -520,7 +547,9 @@ def main():
 
     # Move unet, vae and text_encoder to device and cast to weight_dtype
     unet.to(accelerator.device, dtype=weight_dtype)
-    vae.to(accelerator.device, dtype=weight_dtype)
+    # With the latent cache the VAE is only used once, to build the cache.
+    if args.latent_cache_dir is None:
+        vae.to(accelerator.device, dtype=weight_dtype)
     text_encoder.to(accelerator.device, dtype=weight_dtype)
 
     if args.enable_xformers_memory_efficient_attention:
@@ -731,10 +760,81 @@ def main():
         # Set the training transforms
         train_dataset = dataset["train"].with_transform(preprocess_train)
 
+    if args.latent_cache_dir is not None:
+        # The cache is built from the (shuffled and truncated) train split,
+        # so the row index of an example is its index in the cache.
+        latent_cache_fingerprint = {
+            "pretrained_model_name_or_path": args.pretrained_model_name_or_path,
+            "revision": args.revision,
+            "dataset_name": args.dataset_name,
+            "dataset_config_name": args.dataset_config_name,
+            "train_data_dir": args.train_data_dir,
+            "max_train_samples": args.max_train_samples,
+            "seed": args.seed,
+            "num_images": len(dataset["train"]),
+            "resolution": args.resolution,
+            "center_crop": args.center_crop,
+            "random_flip": args.random_flip,
+            "crops": args.latent_cache_crops,
+        }
+        with accelerator.main_process_first():
+            if not LatentCache.is_valid(args.latent_cache_dir, latent_cache_fingerprint):
+                logger.info(f"Building the latent cache in {args.latent_cache_dir}")
+                cache_dtype = (
+                    torch.float32 if args.latent_cache_device == "cpu" else weight_dtype
+                )
+                vae.to(args.latent_cache_device, dtype=cache_dtype)
+                LatentCache.build(
+                    args.latent_cache_dir,
+                    (example[image_column] for example in dataset["train"]),
+                    len(dataset["train"]),
+                    vae,
+                    make_variant_transform(
+                        args.resolution,
+                        args.center_crop,
+                        args.random_flip,
+                        args.latent_cache_crops,
+                    ),
+                    latent_cache_fingerprint,
+                    batch_size=args.train_batch_size,
+                )
+            latent_cache = LatentCache(args.latent_cache_dir)
+        del vae
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        def preprocess_train_cached(examples):
+            examples["input_ids"] = tokenize_captions(examples)
+            return examples
+
+        # Only the caption and the cache index are formatted, so images are never decoded.
+        train_dataset = (
+            dataset["train"]
+            .add_column("latent_index", list(range(len(dataset["train"]))))
+            .with_transform(
+                preprocess_train_cached, columns=[caption_column, "latent_index"]
+            )
+        )
+
     def collate_fn(examples):
+        input_ids = torch.stack([example["input_ids"] for example in examples])
+        if args.latent_cache_dir is not None:
+            # Pick one cached crop/flip variant per example, as the random transforms would.
+            latent_params = np.stack(
+                [
+                    latent_cache[
+                        example["latent_index"],
+                        random.randrange(latent_cache.num_variants),
+                    ]
+                    for example in examples
+                ]
+            )
+            return {
+                "latent_params": torch.from_numpy(latent_params).float(),
+                "input_ids": input_ids,
+            }
         pixel_values = torch.stack([example["pixel_values"] for example in examples])
         pixel_values = pixel_values.to(memory_format=torch.contiguous_format).float()
-        input_ids = torch.stack([example["input_ids"] for example in examples])
         return {"pixel_values": pixel_values, "input_ids": input_ids}
 
     # DataLoaders creation:
@@ -855,9 +955,14 @@ def main():
 
             with accelerator.accumulate(unet):
                 # Convert images to latent space
-                latents = vae.encode(
-                    batch["pixel_values"].to(dtype=weight_dtype)
-                ).latent_dist.sample()
+                if args.latent_cache_dir is not None:
+                    latents = DiagonalGaussianDistribution(
+                        batch["latent_params"].to(dtype=weight_dtype)
+                    ).sample()
+                else:
+                    latents = vae.encode(
+                        batch["pixel_values"].to(dtype=weight_dtype)
+                    ).latent_dist.sample()
                 latents = latents * 0.18215
 
                 # Sample noise that we'll add to the latents
@@ -4,29 +4,30 @@ from PIL import Image
 
 import re
 import os
-import requests
 
 from utils.share_btn import community_icon_html, loading_icon_html, share_js
+from utils.gradio_client import HedgedBackendClient, ImageCache
 
 # word_list_dataset = load_dataset("stabilityai/word-list", data_files="list.txt", use_auth_token=True)
 # word_list = word_list_dataset["train"]['text']
 
+# JAX_BACKEND_URL에 쉼표로 여러 replica를 적으면 요청을 나눠 보내고, 느린 요청은 다른 replica로 한 번 더 보냅니다.
+backend_client = HedgedBackendClient.from_env()
+# 생성된 이미지는 data URL 대신 파일로 저장해 Gallery에 경로를 넘깁니다.
+image_cache = ImageCache.from_env()
+
 is_gpu_busy = False
-def infer(prompt, negative, scale):
+async def infer(prompt, negative, scale, seed=None):
     global is_gpu_busy
     # for filter in word_list:
     #     if re.search(rf"\b{filter}\b", prompt):
     #         raise gr.Error("Unsafe content found. Please try again with different prompts.")
         
-    images = []
-    url = os.getenv('JAX_BACKEND_URL')
     payload = {'prompt': prompt, 'negative_prompt': negative, 'guidance_scale': scale}
-    images_request = requests.post(url, json = payload)
-    for image in images_request.json()["images"]:
-        image_b64 = (f"data:image/jpeg;base64,{image}")
-        images.append(image_b64)
-    
-    return images
+    if seed is not None:
+        payload['seed'] = int(seed)
+    result = await backend_client.post(payload)
+    return [image_cache.save(image) for image in result["images"]]
     
     
 css = """
@@ -299,9 +300,9 @@ with block:
 
         ex = gr.Examples(examples=examples, fn=infer, inputs=[text, negative, guidance_scale, seed], outputs=[gallery], cache_examples=False)
         ex.dataset.headers = [""]
-        negative.submit(infer, inputs=[text, negative, guidance_scale,seed], outputs=[gallery], postprocess=False)
-        text.submit(infer, inputs=[text, negative, guidance_scale,seed], outputs=[gallery], postprocess=False)
-        btn.click(infer, inputs=[text, negative, guidance_scale,seed], outputs=[gallery], postprocess=False)
+        negative.submit(infer, inputs=[text, negative, guidance_scale,seed], outputs=[gallery])
+        text.submit(infer, inputs=[text, negative, guidance_scale,seed], outputs=[gallery])
+        btn.click(infer, inputs=[text, negative, guidance_scale,seed], outputs=[gallery])
         
         #advanced_button.click(
         #    None,
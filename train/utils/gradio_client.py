@@ -0,0 +1,163 @@
+import asyncio
+import base64
+import hashlib
+import itertools
+import os
+import tempfile
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import aiohttp
+
+
+class HedgedBackendClient:
+    """**여러 backend replica로 요청을 나눠 보내고, 느린 요청은 다른 replica로 한 번 더 보내는 async client입니다.**
+    요청마다 다음 replica부터 순서대로(round robin) 보내고, 최근 응답 시간의 hedge_percentile 분위수가 지나도
+    응답이 없으면 다음 replica로 같은 요청을 보내 먼저 온 응답을 사용합니다. (hedged request)
+    연결 실패나 오류 응답이라면 기다리지 않고 바로 다음 replica로 보냅니다.
+    연결은 aiohttp session 하나로 재사용합니다.
+    Args:
+        urls (List[str]): backend replica 주소 목록.
+        hedge_percentile (float): hedge를 보내기까지 기다릴 응답 시간 분위수(0~100).
+        min_samples (int): 응답 시간이 이만큼 모이기 전에는 hedge하지 않습니다.
+        timeout (float): 요청 하나의 전체 timeout(초).
+        max_connections (int): 유지할 최대 연결 수.
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        hedge_percentile: float = 95,
+        min_samples: int = 20,
+        timeout: float = 120,
+        max_connections: int = 100,
+    ):
+        self.urls = urls
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_connections = max_connections
+        self.latencies = deque(maxlen=200)
+        self._next = itertools.cycle(range(len(urls)))
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def from_env(cls) -> "HedgedBackendClient":
+        """**JAX_BACKEND_URL(쉼표로 여러 개), HEDGE_PERCENTILE로 client를 만듭니다.**"""
+        urls = os.getenv("JAX_BACKEND_URL", "")
+        return cls(
+            [url.strip() for url in urls.split(",") if url.strip()],
+            hedge_percentile=float(os.getenv("HEDGE_PERCENTILE", 95)),
+        )
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # aiohttp session은 event loop 안에서 만들어야 하므로 첫 요청에서 만듭니다.
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=self.timeout,
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+            )
+        return self._session
+
+    def hedge_delay(self) -> Optional[float]:
+        """**hedge를 보내기까지 기다릴 시간(초). 응답 시간이 충분히 모이지 않았다면 None입니다.**"""
+        if len(self.latencies) < self.min_samples:
+            return None
+        latencies = sorted(self.latencies)
+        index = min(
+            len(latencies) - 1, int(len(latencies) * self.hedge_percentile / 100)
+        )
+        return latencies[index]
+
+    async def _post(self, url: str, payload: Dict) -> Dict:
+        start = time.perf_counter()
+        async with self._get_session().post(url, json=payload) as response:
+            response.raise_for_status()
+            result = await response.json()
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def post(self, payload: Dict) -> Dict:
+        """**payload를 backend에 보내고 가장 먼저 성공한 응답 JSON을 리턴합니다.**
+        Raises:
+            Exception: 모든 replica가 실패한 경우 마지막 오류.
+        """
+        if not self.urls:
+            raise ValueError("JAX_BACKEND_URL is not set")
+        start = next(self._next)
+        order = [self.urls[(start + i) % len(self.urls)] for i in range(len(self.urls))]
+        delay = self.hedge_delay()
+        tasks = set()
+        error: Optional[BaseException] = None
+        try:
+            while True:
+                # 실행중인 요청이 없거나(실패) hedge 시간이 지났다면 다음 replica로 보냅니다.
+                if order and (not tasks or delay is not None):
+                    tasks.add(asyncio.ensure_future(self._post(order.pop(0), payload)))
+                if not tasks:
+                    raise error
+                done, tasks = await asyncio.wait(
+                    tasks,
+                    timeout=delay if order else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+class ImageCache:
+    """**Base64 이미지를 내용의 sha256 이름으로 디스크에 저장하고, Gradio가 파일로 보낼 수 있는 경로를 돌려줍니다.**
+    큰 data URL 대신 파일 경로를 Gallery에 넘기면 Gradio가 파일 URL로 보냅니다.
+    Args:
+        root (str): 저장할 디렉토리.
+        max_files (int): 보관할 최대 파일 수. 넘으면 오래된 파일부터 지웁니다.
+    """
+
+    def __init__(self, root: str, max_files: int = 1000):
+        self.root = root
+        self.max_files = max_files
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "ImageCache":
+        """**IMAGE_CACHE_DIR(기본값 임시 디렉토리/emoji-diffusion)로 ImageCache를 만듭니다.**"""
+        return cls(
+            os.getenv(
+                "IMAGE_CACHE_DIR",
+                os.path.join(tempfile.gettempdir(), "emoji-diffusion"),
+            )
+        )
+
+    def save(self, image_b64: str) -> str:
+        """**Base64 이미지를 저장하고 파일 경로를 리턴합니다. 같은 이미지는 한 번만 저장합니다.**"""
+        data = base64.b64decode(image_b64)
+        extension = ".png" if data.startswith(b"\x89PNG") else ".jpg"
+        path = os.path.join(self.root, hashlib.sha256(data).hexdigest() + extension)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._evict()
+        return path
+
+    def _evict(self) -> None:
+        files = [
+            os.path.join(self.root, name)
+            for name in os.listdir(self.root)
+            if not name.endswith(".tmp")
+        ]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[: len(files) - self.max_files]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
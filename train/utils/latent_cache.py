@@ -0,0 +1,164 @@
+import json
+import os
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import transforms
+from torchvision.transforms import functional as TF
+from tqdm.auto import tqdm
+
+
+def make_variant_transform(
+    resolution: int, center_crop: bool, random_flip: bool, num_crops: int = 1
+) -> Callable[[Image.Image], List[torch.Tensor]]:
+    """**이미지 하나를 캐시에 저장할 variant들(crop 위치, 좌우 반전)의 pixel_values로 바꾸는 함수를 만듭니다.**
+    train_transforms의 RandomCrop/RandomHorizontalFlip을 미리 적용해 두는 것으로,
+    center_crop이라면 crop은 하나, 아니라면 num_crops개의 random crop을 만들고
+    random_flip이라면 각 crop을 좌우 반전한 것도 함께 만듭니다.
+    """
+    resize = transforms.Resize(
+        resolution, interpolation=transforms.InterpolationMode.BILINEAR
+    )
+    crop = (
+        transforms.CenterCrop(resolution)
+        if center_crop
+        else transforms.RandomCrop(resolution)
+    )
+    to_tensor = transforms.Compose(
+        [transforms.ToTensor(), transforms.Normalize([0.5], [0.5])]
+    )
+    num_crops = 1 if center_crop else num_crops
+
+    def variant_transform(image: Image.Image) -> List[torch.Tensor]:
+        image = resize(image.convert("RGB"))
+        variants = []
+        for _ in range(num_crops):
+            cropped = crop(image)
+            variants.append(to_tensor(cropped))
+            if random_flip:
+                variants.append(to_tensor(TF.hflip(cropped)))
+        return variants
+
+    return variant_transform
+
+
+class LatentCache:
+    """**VAE encoder의 출력(latent 분포의 mean, logvar)을 디스크에 memmap으로 저장하고 학습 때 읽습니다.**
+    VAE는 학습하지 않으므로 이미지마다 한 번만 encode해 두면 매 step의 VAE 연산이 필요 없습니다.
+    root/latents.npy는 (이미지 수, variant 수, 2 * latent channel, h, w) float16 배열이고,
+    root/meta.json에는 캐시를 만든 설정(fingerprint)과 완료 여부를 저장합니다.
+    학습 때는 variant 하나를 골라 mean + std * noise로 sample하므로
+    기존의 random crop/flip 후 latent_dist.sample()과 같은 분포에서 latent를 얻습니다.
+    Args:
+        root (str): 캐시 디렉토리.
+    """
+
+    LATENTS = "latents.npy"
+    META = "meta.json"
+
+    def __init__(self, root: str):
+        self.root = root
+        with open(os.path.join(root, self.META)) as f:
+            self.meta = json.load(f)
+        self.latents = np.load(os.path.join(root, self.LATENTS), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return self.latents.shape[0]
+
+    @property
+    def num_variants(self) -> int:
+        return self.latents.shape[1]
+
+    def __getitem__(self, key) -> np.ndarray:
+        return self.latents[key]
+
+    @classmethod
+    def is_valid(cls, root: str, fingerprint: Dict) -> bool:
+        """**root에 fingerprint와 같은 설정으로 끝까지 만든 캐시가 있는지 확인합니다.**"""
+        meta_path = os.path.join(root, cls.META)
+        if not os.path.exists(meta_path) or not os.path.exists(
+            os.path.join(root, cls.LATENTS)
+        ):
+            return False
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return meta.get("complete", False) and meta.get("fingerprint") == fingerprint
+
+    @classmethod
+    @torch.no_grad()
+    def build(
+        cls,
+        root: str,
+        images: Iterable[Image.Image],
+        num_images: int,
+        vae,
+        variant_transform: Callable[[Image.Image], List[torch.Tensor]],
+        fingerprint: Dict,
+        batch_size: int = 8,
+    ) -> "LatentCache":
+        """**모든 이미지의 variant를 VAE로 encode해 root에 저장하고 LatentCache를 리턴합니다.**
+        vae는 이미 원하는 device와 dtype으로 옮겨져 있어야 합니다.
+        Args:
+            root (str): 캐시 디렉토리.
+            images (Iterable[Image.Image]): 학습 데이터셋 순서의 이미지들.
+            num_images (int): 이미지 수.
+            vae (AutoencoderKL): encode에 사용할 VAE.
+            variant_transform (Callable): make_variant_transform으로 만든 함수.
+            fingerprint (Dict): 캐시를 만든 설정. 다음 학습에서 같은 설정이면 캐시를 재사용합니다.
+            batch_size (int): 한 번에 encode할 variant 수.
+        """
+        os.makedirs(root, exist_ok=True)
+        meta_path = os.path.join(root, cls.META)
+        # 만드는 도중 중단되면 다음 학습에서 다시 만들도록 complete는 마지막에 기록합니다.
+        with open(meta_path, "w") as f:
+            json.dump({"fingerprint": fingerprint, "complete": False}, f)
+
+        latents = None
+        num_variants = None
+        pending = []
+
+        def flush():
+            nonlocal latents
+            pixel_values = torch.stack([pixels for _, _, pixels in pending])
+            parameters = vae.encode(
+                pixel_values.to(device=vae.device, dtype=vae.dtype)
+            ).latent_dist.parameters
+            parameters = parameters.to("cpu", torch.float16).numpy()
+            if latents is None:
+                latents = np.lib.format.open_memmap(
+                    os.path.join(root, cls.LATENTS),
+                    mode="w+",
+                    dtype=np.float16,
+                    shape=(num_images, num_variants) + parameters.shape[1:],
+                )
+            for (index, variant, _), params in zip(pending, parameters):
+                latents[index, variant] = params
+            pending.clear()
+
+        for index, image in enumerate(
+            tqdm(images, total=num_images, desc="Caching latents")
+        ):
+            variants = variant_transform(image)
+            num_variants = num_variants or len(variants)
+            for variant, pixels in enumerate(variants):
+                pending.append((index, variant, pixels))
+                if len(pending) >= batch_size:
+                    flush()
+        if pending:
+            flush()
+        latents.flush()
+        del latents
+
+        with open(meta_path, "w") as f:
+            json.dump(
+                {
+                    "fingerprint": fingerprint,
+                    "complete": True,
+                    "num_images": num_images,
+                    "num_variants": num_variants,
+                },
+                f,
+            )
+        return cls(root)